@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark suite for visiopy
+
+Measures adding, serialising, saving and loading shapes and pages at
+increasing sizes, plus loading the bundled examples, and reports the time,
+peak memory and output size of every benchmark as JSON.
+
+Run from anywhere:
+
+    python benchmarks/benchmark.py -o before.json
+    python benchmarks/benchmark.py -o after.json --compare before.json
+
+Time is the best of --repeat runs, peak memory is measured with
+tracemalloc in a separate run so its overhead does not skew the timings.
+"""
+
+import argparse
+import gc
+import glob
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'visiopy'))
+
+from pages import (Page, Shape)
+from visio import Document
+
+SHAPE_COUNTS = (100, 1000, 10000, 100000)
+PAGE_COUNTS = (1, 10, 100)
+# Shapes on every page of the page count benchmarks
+SHAPES_PER_PAGE = 100
+
+
+def measure(setup, func, repeat):
+    """Time a function and measure its peak memory
+
+    :param setup: Callable returning the argument of func, not measured
+    :param func: Callable to measure, may return the output size in bytes
+    :param repeat: The number of timed runs
+    :return: dict with seconds, peak_bytes and output_bytes
+    """
+    times = []
+    output = None
+    for _ in range(repeat):
+        state = setup()
+        gc.collect()
+        start = time.perf_counter()
+        output = func(state)
+        times.append(time.perf_counter() - start)
+
+    state = setup()
+    gc.collect()
+    tracemalloc.start()
+    func(state)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {'seconds': min(times), 'peak_bytes': peak, 'output_bytes': output}
+
+
+def new_page():
+    return Page('page1.xml', '0', 'rId1', name='Bench')
+
+
+def filled_page(count):
+    page = new_page()
+    for i in range(count):
+        page.add_shape(pin_x=float(i % 100), pin_y=float(i // 100), width=0.5, height=0.5)
+    return page
+
+
+def filled_document(pages, shapes):
+    document = Document()
+    for p in range(pages):
+        page = document.get_page(document.add_page('Page-{}'.format(p + 1)))
+        for i in range(shapes):
+            page.add_shape(pin_x=float(i % 100), pin_y=float(i // 100), width=0.5, height=0.5)
+    return document
+
+
+def load_all(filename):
+    """Load a document and parse all of its pages
+
+    :return: The file size in bytes
+    """
+    document = Document.from_file(filename)
+    for page in document.page_collection.pages:
+        page.shapes
+    return os.path.getsize(filename)
+
+
+def benchmarks(shape_counts, page_counts, workdir):
+    """Generate the benchmarks
+
+    :return: generator of (name, parameters, setup, func) tuples
+    """
+    target = os.path.join(workdir, 'bench.vsdx')
+
+    def save(document):
+        document.to_file(target)
+        return os.path.getsize(target)
+
+    def saved(pages, shapes):
+        def setup():
+            filled_document(pages, shapes).to_file(target)
+            return target
+        return setup
+
+    for count in shape_counts:
+        params = {'shapes': count, 'pages': 1}
+
+        def add_shapes(page, count=count):
+            for i in range(count):
+                page.add_shape(pin_x=float(i % 100), pin_y=float(i // 100), width=0.5, height=0.5)
+        yield 'Page.add_shape', params, new_page, add_shapes
+
+        def shapes_to_xml(shapes):
+            return sum(len(shape.to_xml()) for shape in shapes)
+        yield 'Shape.to_xml', params, lambda count=count: [Shape(i + 1) for i in range(count)], shapes_to_xml
+
+        yield 'Page.to_xml', params, lambda count=count: filled_page(count), lambda page: len(page.to_xml())
+        yield 'Document.to_file', params, lambda count=count: filled_document(1, count), save
+        yield 'Document.from_file', params, saved(1, count), load_all
+
+    for pages in page_counts:
+        if pages == 1 and SHAPES_PER_PAGE in shape_counts:
+            # Already measured above
+            continue
+        params = {'shapes': SHAPES_PER_PAGE, 'pages': pages}
+        yield 'Document.to_file', params, lambda pages=pages: filled_document(pages, SHAPES_PER_PAGE), save
+        yield 'Document.from_file', params, saved(pages, SHAPES_PER_PAGE), load_all
+
+    for filename in sorted(glob.glob(os.path.join(ROOT, 'examples', '*.vsdx'))):
+        params = {'file': os.path.basename(filename)}
+        yield 'Document.from_file', params, lambda filename=filename: filename, load_all
+
+
+def compare(results, baseline_file):
+    """Print how the timings relate to an earlier run to stderr"""
+    with open(baseline_file) as f:
+        baseline = dict((result_key(result), result) for result in json.load(f)['results'])
+
+    print('{:<24} {:<28} {:>10} {:>10} {:>8}'.format('benchmark', 'parameters', 'before', 'after', 'ratio'),
+          file=sys.stderr)
+    for result in results:
+        before = baseline.get(result_key(result))
+        if before is None or not before['seconds']:
+            continue
+        print('{:<24} {:<28} {:>9.4f}s {:>9.4f}s {:>7.2f}x'.format(
+            result['name'], format_params(result['params']), before['seconds'],
+            result['seconds'], result['seconds'] / before['seconds']), file=sys.stderr)
+
+
+def result_key(result):
+    return result['name'], json.dumps(result['params'], sort_keys=True)
+
+
+def format_params(params):
+    return ' '.join('{}={}'.format(key, value) for key, value in sorted(params.items()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the visiopy benchmarks')
+    parser.add_argument('-o', '--output', help='write the results as JSON to this file')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='timed runs per benchmark')
+    parser.add_argument('--shapes', type=int, nargs='+', default=SHAPE_COUNTS,
+                        help='shape counts to benchmark')
+    parser.add_argument('--pages', type=int, nargs='+', default=PAGE_COUNTS,
+                        help='page counts to benchmark')
+    parser.add_argument('--filter', help='only run benchmarks whose name contains this')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare with')
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, params, setup, func in benchmarks(args.shapes, args.pages, workdir):
+            if args.filter and args.filter not in name:
+                continue
+            result = dict(name=name, params=params, **measure(setup, func, args.repeat))
+            results.append(result)
+            print('{:<24} {:<28} {:>9.4f}s {:>8.1f} MB peak'.format(
+                name, format_params(params), result['seconds'], result['peak_bytes'] / 1e6),
+                file=sys.stderr)
+
+    report = {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'python': platform.python_version(),
+              'platform': platform.platform(),
+              'repeat': args.repeat,
+              'results': results}
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+"""
+visiopy.aio
+
+This module runs the blocking parts of visiopy off the asyncio event loop
+
+Loading and saving documents is CPU bound (XML and zip compression) and
+does blocking file I/O, the async API of :class:`Document` hands that work
+to an executor. A limiter bounds how many documents are loaded or saved at
+once, so a burst of requests queues up instead of flooding the executor.
+
+A thread executor is used by default and fits most uses. A process pool
+sends every document to or from its worker by pickle. Unpickling a loaded
+document costs about as much as parsing it, and saving in a worker only
+updates the copy of the worker, so every save is a full save.
+
+:copyright: (c) 2016 by Mathijs Mortimer.
+"""
+
+import asyncio
+import functools
+import os
+import weakref
+
+
+class Limiter:
+    """Bounds the number of blocking jobs running at once per event loop"""
+
+    def __init__(self, limit):
+        """Initialise the limiter
+
+        :param limit: The number of jobs allowed to run at once
+        """
+        self.limit = limit
+        # asyncio semaphores belong to a single event loop
+        self.semaphores = weakref.WeakKeyDictionary()
+
+    def semaphore(self):
+        """Return the semaphore of the running event loop"""
+        loop = asyncio.get_running_loop()
+        semaphore = self.semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self.semaphores[loop] = asyncio.Semaphore(self.limit)
+        return semaphore
+
+
+# Shared by the async API of all documents
+limiter = Limiter(os.cpu_count() or 1)
+
+# None runs the jobs in the default executor of the event loop
+executor = None
+
+
+def configure(limit=None, pool=None):
+    """Configure the async API
+
+    Applies to the jobs started after the call, on every event loop. Jobs
+    already running or waiting keep the previous limit, so right after the
+    limit is lowered more jobs than the new limit can run until those are
+    done. Settings that are not given are kept, set :data:`executor` to
+    None to go back to the default executor of the event loop.
+
+    :param limit: The number of documents loaded or saved at once
+    :param pool: concurrent.futures executor to run the jobs in, see the
+                 module documentation on process pools
+    """
+    global limiter, executor
+    if limit is not None:
+        limiter = Limiter(limit)
+    if pool is not None:
+        executor = pool
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking function in the executor, within the limit
+
+    :param func: The function to run
+    :return: The result of the function
+    """
+    async with limiter.semaphore():
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
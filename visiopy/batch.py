@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+visiopy.batch
+
+Command line tool generating visio diagrams in bulk from diagram specs
+
+Every spec record becomes one *.vsdx file. Records are read from JSON lines
+or CSV files and generated in a pool of worker processes, optionally
+stamped out of a template diagram.
+
+A JSON lines record looks like this::
+
+    {"output": "site1.vsdx",
+     "pages": [{"name": "Network",
+                "shapes": [{"key": "fw", "pin_x": 2.0, "pin_y": 5.0},
+                           {"key": "sw", "pin_x": 6.0, "pin_y": 5.0}],
+                "connects": [["fw", "sw"]]}]}
+
+Connects refer to shapes by their key, or by their position on the page
+when a shape has no key. Every connect becomes a straight connector glued
+to both shapes.
+
+A CSV file has one row per shape with an 'output' column, an optional
+'page' and 'key' column and a column per shape attribute. Rows with 'from'
+and 'to' columns filled in are connects instead. The rows of a diagram
+must be contiguous.
+
+Shape values are converted as :data:`SHAPE_COLUMNS` says, for both
+formats. A record that cannot be read or generated is reported as failed,
+the other records are still generated.
+
+:copyright: (c) 2016 by Mathijs Mortimer.
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from template import DocumentTemplate
+from visio import Document
+
+# Template of the worker process, see init_worker
+_template = None
+
+
+def as_flag(value):
+    """Convert a flag given as CSV string or JSON value"""
+    if isinstance(value, str):
+        return value.lower() in ('1', 'true', 'yes')
+    return bool(value)
+
+
+# Conversion of the shape attributes, other attributes are kept as they are
+SHAPE_COLUMNS = {'line_style': int,
+                 'fill_style': int,
+                 'text_style': int,
+                 'pin_x': float,
+                 'pin_y': float,
+                 'width': float,
+                 'height': float,
+                 'loc_pin_x': float,
+                 'loc_pin_y': float,
+                 'angle': float,
+                 'flip_x': as_flag,
+                 'flip_y': as_flag,
+                 'resize_mode': int}
+
+
+class FailedRecord:
+    """Stands in for a spec record that could not be read
+
+    :func:`generate` reports it as a failure, so the other records are
+    still generated.
+    """
+
+    def __init__(self, output, error):
+        """Initialise the record
+
+        :param output: The output of the record, or where it was read from
+        :param error: The exception raised reading the record
+        """
+        self.output = output
+        self.error = '{}: {}'.format(type(error).__name__, error)
+
+
+def read_jsonl(filename):
+    """Read diagram specs from a JSON lines file
+
+    A line that is not a valid JSON object becomes a :class:`FailedRecord`.
+
+    :param filename: Filename of the specs
+    :return: generator of spec records
+    """
+    with open(filename) as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError('Record is a JSON {}, not an object'
+                                     .format(type(record).__name__))
+            except ValueError as e:
+                yield FailedRecord('line {}'.format(number), e)
+            else:
+                yield record
+
+
+def read_csv(filename):
+    """Read diagram specs from a CSV file
+
+    :param filename: Filename of the specs
+    :return: generator of spec records
+    """
+    with open(filename, newline='') as f:
+        rows = csv.DictReader(f)
+        for output, group in itertools.groupby(rows, key=lambda row: row['output']):
+            pages = {}
+            for row in group:
+                page = pages.setdefault(row.get('page') or 'Page-1',
+                                        {'shapes': [], 'connects': []})
+                if row.get('from') and row.get('to'):
+                    page['connects'].append([row['from'], row['to']])
+                else:
+                    page['shapes'].append(csv_shape(row))
+
+            yield {'output': output,
+                   'pages': [dict(page, name=name) for name, page in pages.items()]}
+
+
+def csv_shape(row):
+    """Turn a CSV row into a shape spec
+
+    :param row: dict of column name to value
+    :return: dict of shape attributes as strings
+    """
+    return dict((name, value) for name, value in row.items()
+                if name not in ('output', 'page', 'from', 'to') and value not in (None, ''))
+
+
+def shape_values(shape_spec, key):
+    """Convert the attributes of a shape spec as :data:`SHAPE_COLUMNS` says
+
+    :param shape_spec: dict of shape attributes, without the key
+    :param key: The key of the shape, for the error message
+    :return: dict of shape keyword arguments
+    """
+    values = {}
+    for name, value in shape_spec.items():
+        convert = SHAPE_COLUMNS.get(name)
+        if convert is None:
+            values[name] = value
+            continue
+        try:
+            values[name] = convert(value)
+        except (TypeError, ValueError):
+            raise ValueError('Invalid {} {!r} for shape {}'.format(name, value, key))
+    return values
+
+
+def read_specs(filename):
+    """Read diagram specs, the format is taken from the file extension
+
+    :param filename: Filename of a *.jsonl or *.csv file
+    :return: generator of spec records
+    """
+    if filename.endswith('.csv'):
+        return read_csv(filename)
+    return read_jsonl(filename)
+
+
+def build_document(record, template=None):
+    """Build a document from a spec record
+
+    :param record: A spec record, see the module documentation
+    :param template: Instance of :class:`DocumentTemplate` to start from
+    :return: Instance of :class:`Document`
+    """
+    document = template.new_document() if template is not None else Document()
+
+    for page_spec in record.get('pages', []):
+        page = document.get_page(document.add_page(page_spec.get('name', '')))
+
+        shape_ids = {}
+        for index, shape_spec in enumerate(page_spec.get('shapes', [])):
+            shape_spec = dict(shape_spec)
+            key = str(shape_spec.pop('key', index))
+            shape_ids[key] = page.add_shape(**shape_values(shape_spec, key))
+
+        for shape1, shape2 in page_spec.get('connects', []):
+            try:
+                begin, end = shape_ids[str(shape1)], shape_ids[str(shape2)]
+            except KeyError as e:
+                raise KeyError('Connect to unknown shape {} on page {}'
+                               .format(e.args[0], page_spec.get('name', '')))
+            page.add_connect(begin, end)
+
+    return document
+
+
+def init_worker(template_file):
+    """Load the template once per worker process"""
+    global _template
+    if template_file:
+        _template = DocumentTemplate.from_file(template_file)
+
+
+def generate(record, output_dir):
+    """Generate a single diagram, runs in a worker process
+
+    :param record: A spec record, see the module documentation
+    :param output_dir: Directory to write the diagram to
+    :return: tuple of (output filename, seconds, size in bytes, error)
+             where error is None on success
+    """
+    if isinstance(record, FailedRecord):
+        return os.path.join(output_dir, str(record.output)), 0.0, 0, record.error
+
+    start = time.perf_counter()
+    filename = os.path.join(output_dir, str(record.get('output', '')))
+    try:
+        if not filename.endswith('.vsdx'):
+            filename += '.vsdx'
+        build_document(record, _template).to_file(filename)
+        return filename, time.perf_counter() - start, os.path.getsize(filename), None
+    except Exception as e:
+        return filename, time.perf_counter() - start, 0, '{}: {}'.format(type(e).__name__, e)
+
+
+def run(records, output_dir, jobs=None, template_file=None):
+    """Generate diagrams in a pool of worker processes
+
+    At most a few records per worker are in flight at once, so specs of
+    any size are streamed.
+
+    :param records: Iterable of spec records
+    :param output_dir: Directory to write the diagrams to
+    :param jobs: The number of worker processes, 0 generates in this process
+    :param template_file: Filename of a template diagram
+    :return: generator of the results of :func:`generate`, in record order
+    """
+    if jobs == 0:
+        init_worker(template_file)
+        for record in records:
+            yield generate(record, output_dir)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker,
+                             initargs=(template_file,)) as executor:
+        window = (jobs or os.cpu_count() or 1) * 4
+        in_flight = deque()
+        for record in records:
+            in_flight.append(executor.submit(generate, record, output_dir))
+            if len(in_flight) >= window:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+
+def percentile(values, fraction):
+    """Return a percentile of sorted values"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate visio diagrams from diagram specs')
+    parser.add_argument('specs', help='*.jsonl or *.csv file with one diagram per record')
+    parser.add_argument('-o', '--output-dir', default='.', help='directory to write the diagrams to')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help='number of worker processes, 0 to generate in-process')
+    parser.add_argument('-t', '--template', help='diagram to stamp every document out of')
+    parser.add_argument('--timings', help='write per file timings as JSON lines to this file')
+    parser.add_argument('-q', '--quiet', action='store_true', help='only print the summary')
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    timings = open(args.timings, 'w') if args.timings else None
+
+    start = time.perf_counter()
+    durations = []
+    failures = []
+    total_size = 0
+    try:
+        for filename, seconds, size, error in run(read_specs(args.specs), args.output_dir,
+                                                  args.jobs, args.template):
+            total_size += size
+            if error is not None:
+                failures.append((filename, error))
+                print('FAILED {}: {}'.format(filename, error), file=sys.stderr)
+            else:
+                durations.append(seconds)
+                if not args.quiet:
+                    print('{} {:.1f}ms'.format(filename, seconds * 1000))
+            if timings is not None:
+                timings.write(json.dumps({'output': filename, 'seconds': seconds,
+                                          'size': size, 'error': error}) + '\n')
+    finally:
+        if timings is not None:
+            timings.close()
+    elapsed = time.perf_counter() - start
+
+    # Only the diagrams written count towards the rate and the timings
+    durations.sort()
+    print('{} diagrams written, {} failed in {:.2f}s ({:.1f} diagrams/s, {:.1f} MB written)'
+          .format(len(durations), len(failures), elapsed,
+                  len(durations) / elapsed if elapsed else 0.0, total_size / 1e6))
+    if durations:
+        print('per diagram: mean {:.1f}ms, p50 {:.1f}ms, p95 {:.1f}ms, max {:.1f}ms'
+              .format(sum(durations) / len(durations) * 1000,
+                      percentile(durations, 0.5) * 1000,
+                      percentile(durations, 0.95) * 1000,
+                      durations[-1] * 1000))
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -23,6 +23,8 @@ class ContentTypes:
         """
         self.defaults = kwargs.get('defaults', {})
         self.overrides = kwargs.get('overrides', {})
+        # Set when [Content_Types].xml has to be generated again on the next save
+        self.dirty = True
 
         # Add the default visio file content types
         # TODO: Have to decide if we want to be allowed to overwrite these by keyword args?
@@ -43,6 +45,7 @@ class ContentTypes:
         :param content_type:  e.g. 'application/vnd.ms-visio.page+xml'
         """
         self.overrides[part_name] = content_type
+        self.dirty = True
 
     def add_default(self, extension, content_type):
         """Add a default item to Types
@@ -51,14 +54,23 @@ class ContentTypes:
         :param content_type: The ContentType. e.g. 'image/x-emf'
         """
         self.defaults[extension] = content_type
+        self.dirty = True
 
     def rm(self, part_name):
         """Remove a part from the overrides"""
         del self.overrides[part_name]
+        self.dirty = True
 
     def rm_default(self, extension):
         """Remove a part from the defaults"""
         del self.defaults[extension]
+        self.dirty = True
+
+    def copy(self):
+        """Return an independent copy of the content types"""
+        content_types = self.__class__(defaults=dict(self.defaults), overrides=dict(self.overrides))
+        content_types.dirty = self.dirty
+        return content_types
 
     def to_xml(self):
         """Generate XML data for [Content_Types].xml
@@ -79,7 +91,7 @@ class ContentTypes:
     def from_xml(cls, xml_file):
         """Generate ContentTypes from xml
 
-        :param xml_file: the location of the [Content_Types].xml file
+        :param xml_file: Filename or file object of the [Content_Types].xml file
         """
         tree = ET.parse(xml_file)
         root = tree.getroot()
@@ -93,4 +105,7 @@ class ContentTypes:
             if item.tag == '{http://schemas.openxmlformats.org/package/2006/content-types}Override':
                 overrides[item.attrib['PartName']] = item.attrib['ContentType']
 
-        return cls(defaults=defaults, overrides=overrides)
+        content_types = cls(defaults=defaults, overrides=overrides)
+        # Unchanged until modified, the source part can be saved as it is
+        content_types.dirty = False
+        return content_types
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+"""
+visiopy.geometry
+
+This module holds the pre-serialised Geometry sections of standard shapes
+
+:copyright: (c) 2016 by Mathijs Mortimer.
+"""
+
+from xmlutils import (xml_attrs, xml_cell)
+
+
+class GeometryTemplate:
+    """A Geometry section serialised once and spliced into every shape
+
+    The rows use relative coordinates (RelMoveTo, RelLineTo, ...) where 0
+    and 1 are the edges of the shape, so the same XML fits every size.
+    """
+
+    def __init__(self, rows, no_fill=False, no_line=False, cells=()):
+        """Initialise and serialise the template
+
+        :param rows: List of (row type, ((cell name, value), ...)) tuples
+                     e.g. ('RelLineTo', (('X', 1), ('Y', 0)))
+        :param no_fill: True for open paths such as lines
+        :param no_line: True to hide the outline
+        :param cells: (name, value) tuples of shape cells that go with the
+                      geometry, e.g. the Rounding of a rounded rectangle
+        """
+        self.rows = rows
+        self.cells = ''.join(xml_cell(name, value) for name, value in cells)
+
+        xml = ['<Section N="Geometry" IX="0">',
+               xml_cell('NoFill', '1' if no_fill else '0'),
+               xml_cell('NoLine', '1' if no_line else '0'),
+               xml_cell('NoShow', '0'),
+               xml_cell('NoSnap', '0'),
+               xml_cell('NoQuickDrag', '0')]
+        for ix, (row_type, row_cells) in enumerate(rows, 1):
+            xml.append('<Row{}>'.format(xml_attrs((('T', row_type), ('IX', ix)))))
+            xml.extend(xml_cell(name, value) for name, value in row_cells)
+            xml.append('</Row>')
+        xml.append('</Section>')
+        self.section = ''.join(xml)
+
+
+geometries = {}
+
+
+def register_geometry(name, template):
+    """Register a geometry template so shapes can refer to it by name
+
+    :param name: The name of the geometry e.g. 'rectangle'
+    :param template: Instance of :class:`GeometryTemplate`
+    """
+    geometries[name] = template
+
+
+def get_geometry(name):
+    """Return the geometry template registered under name
+
+    :param name: The name of the geometry e.g. 'rectangle'
+    :return: Instance of :class:`GeometryTemplate`
+    """
+    try:
+        return geometries[name]
+    except KeyError:
+        raise KeyError('Geometry {} not registered'.format(name))
+
+
+register_geometry('rectangle', GeometryTemplate(
+    [('RelMoveTo', (('X', 0), ('Y', 0))),
+     ('RelLineTo', (('X', 1), ('Y', 0))),
+     ('RelLineTo', (('X', 1), ('Y', 1))),
+     ('RelLineTo', (('X', 0), ('Y', 1))),
+     ('RelLineTo', (('X', 0), ('Y', 0)))]))
+
+register_geometry('rounded_rectangle', GeometryTemplate(
+    [('RelMoveTo', (('X', 0), ('Y', 0))),
+     ('RelLineTo', (('X', 1), ('Y', 0))),
+     ('RelLineTo', (('X', 1), ('Y', 1))),
+     ('RelLineTo', (('X', 0), ('Y', 1))),
+     ('RelLineTo', (('X', 0), ('Y', 0)))],
+    cells=(('Rounding', '0.1'),)))
+
+# Two half ellipses, X/Y is the end point and A/B a point on the arc
+register_geometry('ellipse', GeometryTemplate(
+    [('RelMoveTo', (('X', 1), ('Y', 0.5))),
+     ('RelEllipticalArcTo', (('X', 0), ('Y', 0.5), ('A', 0.5), ('B', 1), ('C', 0), ('D', 1))),
+     ('RelEllipticalArcTo', (('X', 1), ('Y', 0.5), ('A', 0.5), ('B', 0), ('C', 0), ('D', 1)))]))
+
+register_geometry('line', GeometryTemplate(
+    [('RelMoveTo', (('X', 0), ('Y', 0.5))),
+     ('RelLineTo', (('X', 1), ('Y', 0.5)))],
+    no_fill=True))
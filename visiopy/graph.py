@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+
+"""
+visiopy.graph
+
+This module implements a graph index over the connects of a page
+
+:copyright: (c) 2016 by Mathijs Mortimer.
+"""
+
+from collections import deque
+
+# FromCell values gluing the begin or the end of a 1-D connector
+BEGIN_CELLS = ('BeginX', 'BeginY')
+END_CELLS = ('EndX', 'EndY')
+
+
+class ConnectionGraph:
+    """Adjacency lists of the shapes on a page, built from its connects
+
+    A connector glued to a shape with its begin and to another shape with
+    its end links those two shapes. Any other connect, e.g. a control
+    handle glued to a shape, links the FromSheet and ToSheet shapes
+    directly.
+
+    All shape IDs are handled as strings, the way they appear in the XML.
+    """
+
+    def __init__(self, connects=()):
+        """Initialise the graph
+
+        :param connects: :class:`Connect` classes to build the graph from
+        """
+        # shape ID -> {neighbour shape ID: set of connector IDs}
+        # Direct glue without a connector is recorded as connector None
+        self.adjacency = {}
+        # connector ID -> [begin shape ID, end shape ID]
+        self.connectors = {}
+
+        for connect in connects:
+            self.add_connect(connect)
+
+    def __contains__(self, shape_id):
+        return str(shape_id) in self.adjacency
+
+    def add_connect(self, connect):
+        """Add a single connect to the graph
+
+        :param connect: Instance of :class:`Connect`
+        """
+        from_sheet = str(getattr(connect, 'FromSheet', ''))
+        to_sheet = str(getattr(connect, 'ToSheet', ''))
+        if not from_sheet or not to_sheet:
+            return
+
+        from_cell = getattr(connect, 'FromCell', None)
+        if from_cell in BEGIN_CELLS:
+            end = 0
+        elif from_cell in END_CELLS:
+            end = 1
+        else:
+            self._link(from_sheet, to_sheet, None)
+            return
+
+        endpoints = self.connectors.setdefault(from_sheet, [None, None])
+        if endpoints[end] == to_sheet:
+            # BeginX and BeginY glued to the same shape
+            return
+        old = endpoints[end]
+        endpoints[end] = to_sheet
+        other = endpoints[1 - end]
+        if other is not None:
+            if old is not None:
+                self._unlink(old, other, from_sheet)
+            self._link(to_sheet, other, from_sheet)
+
+    def _link(self, shape1, shape2, connector):
+        self.adjacency.setdefault(shape1, {}).setdefault(shape2, set()).add(connector)
+        self.adjacency.setdefault(shape2, {}).setdefault(shape1, set()).add(connector)
+
+    def _unlink(self, shape1, shape2, connector):
+        for a, b in ((shape1, shape2), (shape2, shape1)):
+            links = self.adjacency[a][b]
+            links.discard(connector)
+            if not links:
+                del self.adjacency[a][b]
+                if not self.adjacency[a]:
+                    # Shapes without any link are not part of the graph
+                    del self.adjacency[a]
+
+    def neighbors(self, shape_id):
+        """Return the shapes linked to a shape
+
+        :param shape_id: ID of the shape
+        :return: set of shape IDs
+        """
+        return set(self.adjacency.get(str(shape_id), ()))
+
+    def connectors_between(self, shape1, shape2):
+        """Return the connectors linking two shapes
+
+        :param shape1: ID of the first shape
+        :param shape2: ID of the second shape
+        :return: set of connector IDs, None stands for direct glue
+        """
+        return set(self.adjacency.get(str(shape1), {}).get(str(shape2), ()))
+
+    def connector_endpoints(self, connector_id):
+        """Return the shapes a connector is glued to
+
+        :param connector_id: ID of the connector shape
+        :return: tuple of (begin shape ID, end shape ID), an end that is not
+                 glued is None
+        """
+        try:
+            return tuple(self.connectors[str(connector_id)])
+        except KeyError:
+            raise KeyError('Connector {} not found'.format(connector_id))
+
+    def components(self):
+        """Return the groups of shapes linked to each other
+
+        Shapes without any link are not part of the graph.
+
+        :return: List of sets of shape IDs, largest first
+        """
+        seen = set()
+        components = []
+        for shape_id in self.adjacency:
+            if shape_id in seen:
+                continue
+            component = self._reachable(shape_id)
+            seen.update(component)
+            components.append(component)
+        components.sort(key=len, reverse=True)
+        return components
+
+    def component(self, shape_id):
+        """Return all shapes reachable from a shape, including itself
+
+        :param shape_id: ID of the shape
+        :return: set of shape IDs
+        """
+        return self._reachable(str(shape_id))
+
+    def _reachable(self, start):
+        found = {start}
+        queue = deque([start])
+        while queue:
+            for neighbour in self.adjacency.get(queue.popleft(), ()):
+                if neighbour not in found:
+                    found.add(neighbour)
+                    queue.append(neighbour)
+        return found
+
+    def shortest_path(self, shape1, shape2):
+        """Find the path with the fewest hops between two shapes
+
+        :param shape1: ID of the shape to start from
+        :param shape2: ID of the shape to reach
+        :return: List of shape IDs from shape1 to shape2, or None when the
+                 shapes are not linked
+        """
+        start = str(shape1)
+        goal = str(shape2)
+        if start == goal:
+            return [start]
+
+        previous = {start: None}
+        queue = deque([start])
+        while queue:
+            current = queue.popleft()
+            for neighbour in self.adjacency.get(current, ()):
+                if neighbour in previous:
+                    continue
+                previous[neighbour] = current
+                if neighbour == goal:
+                    path = [goal]
+                    while previous[path[-1]] is not None:
+                        path.append(previous[path[-1]])
+                    path.reverse()
+                    return path
+                queue.append(neighbour)
+        return None
+
+    def is_connected(self, shape1, shape2):
+        """Check whether a path exists between two shapes"""
+        return self.shortest_path(shape1, shape2) is not None
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+"""
+visiopy.ids
+
+This module hands out the numeric IDs used throughout a visio package
+
+:copyright: (c) 2016 by Mathijs Mortimer.
+"""
+
+import re
+
+
+class IdAllocator:
+    """Hands out increasing integer IDs in constant time
+
+    The allocator is seeded once with the IDs already in use, after that
+    every ID is handed out by bumping a counter. IDs are never reused, so
+    removing items never invalidates the counter.
+    """
+
+    def __init__(self, start=1, used=()):
+        """Initialise the allocator
+
+        :param start: The first ID to hand out
+        :param used: IDs already in use. Either ints or strings ending in a
+                     number, e.g. 'rId3' or 'page3.xml'
+        """
+        self.next_id = start
+        for id in used:
+            self.reserve(id)
+
+    def allocate(self):
+        """Allocate a single ID
+
+        :return: The new ID as int
+        """
+        id = self.next_id
+        self.next_id += 1
+        return id
+
+    def allocate_range(self, count):
+        """Allocate a block of consecutive IDs
+
+        :param count: The number of IDs to allocate
+        :return: range of the new IDs
+        """
+        start = self.next_id
+        self.next_id += count
+        return range(start, self.next_id)
+
+    def reserve(self, id):
+        """Mark an existing ID as used
+
+        :param id: The ID in use. Either an int or a string ending in a
+                   number, e.g. 'rId3' or 'page3.xml'
+        """
+        id = id_number(id)
+        if id >= self.next_id:
+            self.next_id = id + 1
+
+
+def id_number(id):
+    """Return the number within an ID
+
+    :param id: int or a string containing a number, e.g. 'rId3' or 'page3.xml'
+    :return: The number as int
+    """
+    if isinstance(id, int):
+        return id
+    return int(re.search(r'\d+', id).group())
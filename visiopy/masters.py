@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+
+"""
+visiopy.masters
+
+This module handles the masters a visio document carries from its stencils
+
+Parsed masters are kept in a process wide cache keyed by the hash of
+their contents, so documents made from the same stencils share them.
+
+:copyright: (c) 2016 by Mathijs Mortimer.
+"""
+
+import hashlib
+import io
+import threading
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from pages import Page
+from relationships import Relationship
+
+ns = '{http://schemas.microsoft.com/office/visio/2012/main}'
+r_ns = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+
+
+class Master:
+    """The parsed contents of a master?.xml part
+
+    Masters come out of a :class:`MasterCache` and are shared between
+    documents, treat them as read-only.
+    """
+
+    def __init__(self, shapes=(), connects=(), size=0):
+        """Initialise the master
+
+        :param shapes: The top level :class:`Shape` classes of the master
+        :param connects: The :class:`Connect` classes of the master
+        :param size: Size of the master?.xml part in bytes
+        """
+        self.shapes = tuple(shapes)
+        self.connects = tuple(connects)
+        self.size = size
+
+    @classmethod
+    def from_xml(cls, data):
+        """Parse a master?.xml part
+
+        :param data: The master?.xml part contents as bytes
+        """
+        shapes, connects = Page.parse(io.BytesIO(data))
+        return cls(shapes, connects, len(data))
+
+
+class MasterCache:
+    """Least recently used cache of parsed masters keyed by content hash
+
+    The memory budget is measured in bytes of master XML, the parsed
+    masters take a small multiple of that.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        """Initialise the cache
+
+        :param max_bytes: Evict the least recently used masters once the
+                          cached masters exceed this many bytes of XML
+        """
+        self.max_bytes = max_bytes
+        self.masters = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.masters)
+
+    def __contains__(self, key):
+        return key in self.masters
+
+    @staticmethod
+    def content_key(data):
+        """Return the cache key of a master?.xml part
+
+        :param data: The master?.xml part contents as bytes
+        """
+        return hashlib.sha1(data).hexdigest()
+
+    def get(self, data):
+        """Return the parsed master for a master?.xml part
+
+        Parses the part only when no master with the same contents is
+        cached yet.
+
+        :param data: The master?.xml part contents as bytes
+        :return: Instance of :class:`Master`
+        """
+        key = self.content_key(data)
+        with self.lock:
+            master = self.masters.get(key)
+            if master is not None:
+                self.masters.move_to_end(key)
+                self.hits += 1
+                return master
+            self.misses += 1
+
+        # Parse outside the lock, two threads may parse the same master
+        # at once, the last one wins
+        master = Master.from_xml(data)
+        with self.lock:
+            if key in self.masters:
+                self.size -= self.masters[key].size
+            self.masters[key] = master
+            self.size += master.size
+            self._evict()
+        return master
+
+    def resize(self, max_bytes):
+        """Change the memory budget, evicting masters when needed
+
+        :param max_bytes: The new budget in bytes of master XML
+        """
+        with self.lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used masters until the budget is met
+
+        The most recent master always stays, even when it alone exceeds
+        the budget.
+        """
+        while self.size > self.max_bytes and len(self.masters) > 1:
+            key, master = self.masters.popitem(last=False)
+            self.size -= master.size
+
+    def clear(self):
+        """Drop all cached masters"""
+        with self.lock:
+            self.masters.clear()
+            self.size = 0
+
+
+# Shared by all documents of the process
+master_cache = MasterCache()
+
+
+class DocumentMasters:
+    """The masters of a single document by master ID
+
+    Maps the Master attribute of a shape instance to its :class:`Master`.
+    Masters are parsed through a :class:`MasterCache` on first use, the
+    mapping is read again when masters.xml is replaced, e.g. by importing
+    masters.
+    """
+
+    masters_part = 'visio/masters/masters.xml'
+    rels_part = 'visio/masters/_rels/masters.xml.rels'
+
+    def __init__(self, parts, cache=master_cache):
+        """Initialise the masters
+
+        :param parts: dict of part name to :class:`RawPart` of the document
+        :param cache: Instance of :class:`MasterCache`
+        """
+        self.parts = parts
+        self.cache = cache
+        # The masters.xml part the mapping below was read from
+        self.source = None
+        # master ID -> part name
+        self.part_names = {}
+        # master ID -> Master
+        self.masters = {}
+
+    def __getstate__(self):
+        # Pages going to a worker process take only the parts along, the
+        # masters are looked up in the cache of that process
+        return {'parts': self.parts}
+
+    def __setstate__(self, state):
+        self.__init__(state['parts'])
+
+    def _refresh(self):
+        source = self.parts.get(self.masters_part)
+        if source is self.source:
+            return
+        self.source = source
+        self.part_names = {}
+        self.masters = {}
+        if source is None or self.rels_part not in self.parts:
+            return
+
+        rels = Relationship.from_xml(io.BytesIO(self.parts[self.rels_part].read()))
+        for elem in ET.fromstring(source.read()).iter(ns + 'Master'):
+            rel = elem.find(ns + 'Rel')
+            if rel is not None and rel.get(r_ns + 'id') in rels.rels:
+                target = rels.rels[rel.get(r_ns + 'id')][0]
+                self.part_names[elem.get('ID')] = 'visio/masters/' + target.split('/')[-1]
+
+    def get(self, master_id):
+        """Return the master with the given ID
+
+        :param master_id: The master ID, e.g. the Master attribute of a shape
+        :return: Instance of :class:`Master`, or None when the document has
+                 no such master
+        """
+        self._refresh()
+        master_id = str(master_id)
+        master = self.masters.get(master_id)
+        if master is None:
+            part_name = self.part_names.get(master_id)
+            if part_name is None or part_name not in self.parts:
+                return None
+            master = self.masters[master_id] = self.cache.get(self.parts[part_name].read())
+        return master
+
+    def shape(self, master_id):
+        """Return the top level shape of a master, the shape its instances
+        inherit their cells from
+
+        :param master_id: The master ID, e.g. the Master attribute of a shape
+        :return: Instance of :class:`SheetShape`, or None
+        """
+        master = self.get(master_id)
+        if master is None or not master.shapes:
+            return None
+        return master.shapes[0]
@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+
+"""
+visiopy.package
+
+This module handles reading and writing the zip container of a visio package
+
+:copyright: (c) 2016 by Mathijs Mortimer.
+"""
+
+import fnmatch
+import struct
+import time
+import zipfile
+import zlib
+
+# Compression level of parts that are stored without compression
+STORED = 'stored'
+
+# Named compression settings and their zlib levels
+COMPRESSION_LEVELS = {'stored': STORED,
+                      'fast': 1,
+                      'default': zlib.Z_DEFAULT_COMPRESSION,
+                      'max': 9}
+
+
+class CompressionPolicy:
+    """Decides how every part written to a package is compressed
+
+    A setting is one of 'stored', 'fast', 'default' or 'max', or a zlib
+    level from 0 to 9.
+    """
+
+    def __init__(self, default='default', rules=(), recompress=False):
+        """Initialise the policy
+
+        :param default: The setting of all parts no rule matches
+        :param rules: (pattern, setting) tuples tried in order, the patterns
+                      are fnmatch style part names, e.g.
+                      ('visio/pages/*', 'fast')
+        :param recompress: Also apply the policy to parts copied still
+                           compressed from a source package. By default
+                           they are copied as they are
+        """
+        self.default = self.level(default)
+        self.rules = [(pattern, self.level(setting)) for pattern, setting in rules]
+        self.recompress = recompress
+
+    @staticmethod
+    def level(setting):
+        """Turn a setting into a zlib level or :data:`STORED`"""
+        if isinstance(setting, str):
+            try:
+                return COMPRESSION_LEVELS[setting]
+            except KeyError:
+                raise ValueError('Unknown compression setting {}'.format(setting))
+        if not -1 <= setting <= 9:
+            raise ValueError('Compression level {} out of range'.format(setting))
+        return setting
+
+    @classmethod
+    def from_setting(cls, compression):
+        """Return the policy for a compression argument
+
+        :param compression: None for the default policy, a setting applied
+                            to all parts including the copied ones, or a
+                            :class:`CompressionPolicy`
+        """
+        if isinstance(compression, cls):
+            return compression
+        if compression is None:
+            return cls()
+        return cls(compression, recompress=True)
+
+    def level_for(self, part_name):
+        """Return the zlib level or :data:`STORED` for a part
+
+        :param part_name: Name of the part. e.g. 'visio/pages/page1.xml'
+        """
+        for pattern, level in self.rules:
+            if fnmatch.fnmatchcase(part_name, pattern):
+                return level
+        return self.default
+
+    def accepts(self, part_name, raw_part):
+        """Check whether a compressed part can be written as it is
+
+        :param part_name: Name of the part. e.g. 'visio/pages/page1.xml'
+        :param raw_part: Instance of :class:`RawPart`
+        """
+        if raw_part.level is None and not self.recompress:
+            # Copied from a source package
+            return True
+        level = self.level_for(part_name)
+        if level == STORED:
+            return raw_part.info.compress_type == zipfile.ZIP_STORED
+        return raw_part.info.compress_type == zipfile.ZIP_DEFLATED and raw_part.level == level
+
+
+class PackageWriter:
+    """Writes the parts of a visio package straight into a zip archive
+
+    Every part is written as its own zip entry, there is no intermediate
+    directory on disk. Parts are compressed as the
+    :class:`CompressionPolicy` of the writer says.
+    """
+
+    def __init__(self, file, compression=None):
+        """Initialise the writer
+
+        :param file: Filename or writable binary file object
+        :param compression: None for the default policy, a setting applied
+                            to all parts, or a :class:`CompressionPolicy`
+        """
+        self.policy = CompressionPolicy.from_setting(compression)
+        self.zip_file = zipfile.ZipFile(file, 'w', zipfile.ZIP_DEFLATED)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def compress(self, part_name, data):
+        """Compress a part in memory as the policy says
+
+        :param part_name: Name of the part. e.g. 'visio/pages/page1.xml'
+        :param data: The part contents as str or bytes
+        :return: Instance of :class:`RawPart`
+        """
+        return compress_part(part_name, data, self.policy.level_for(part_name))
+
+    def write_copy(self, part_name, raw_part):
+        """Copy a compressed part into the package
+
+        The part is written as it is, unless the policy wants it
+        compressed differently.
+
+        :param part_name: Name of the part. e.g. 'visio/masters/master1.xml'
+        :param raw_part: Instance of :class:`RawPart`
+        """
+        if not self.policy.accepts(part_name, raw_part):
+            raw_part = self.compress(part_name, raw_part.read())
+        self.write_raw(part_name, raw_part)
+
+    def write_raw(self, part_name, raw_part):
+        """Copy a still compressed part into the package
+
+        The compressed bytes are written as they are, without
+        decompressing or recompressing them.
+
+        :param part_name: Name of the part. e.g. 'visio/masters/master1.xml'
+        :param raw_part: Instance of :class:`RawPart`
+        """
+        zip_file = self.zip_file
+        zinfo = zipfile.ZipInfo(part_name, raw_part.info.date_time)
+        zinfo.compress_type = raw_part.info.compress_type
+        zinfo.CRC = raw_part.info.CRC
+        zinfo.file_size = raw_part.info.file_size
+        zinfo.compress_size = len(raw_part.compressed)
+        zinfo.external_attr = raw_part.info.external_attr or 0o600 << 16
+
+        # zipfile has no public API for adding precompressed data, this
+        # mirrors what ZipFile.open(..., 'w') does for a part whose sizes
+        # and CRC are known up front, so no data descriptor is needed
+        with zip_file._lock:
+            if zip_file._writing:
+                raise ValueError("Can't write to the ZIP file while there is "
+                                 "another write handle open on it.")
+            if zip_file._seekable:
+                zip_file.fp.seek(zip_file.start_dir)
+            zinfo.header_offset = zip_file.fp.tell()
+            zip_file._writecheck(zinfo)
+            zip_file._didModify = True
+            zip_file.fp.write(zinfo.FileHeader())
+            zip_file.fp.write(raw_part.compressed)
+            zip_file.start_dir = zip_file.fp.tell()
+            zip_file.filelist.append(zinfo)
+            zip_file.NameToInfo[zinfo.filename] = zinfo
+
+    def close(self):
+        """Finish the zip archive"""
+        self.zip_file.close()
+
+
+class PackageReader:
+    """Reads the parts of a visio package straight from the zip archive
+
+    Parts are decompressed on demand, nothing is extracted to disk.
+    """
+
+    def __init__(self, file):
+        """Initialise the reader
+
+        :param file: Filename or readable binary file object
+        """
+        self.zip_file = zipfile.ZipFile(file, 'r')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __contains__(self, part_name):
+        return part_name in self.zip_file.NameToInfo
+
+    def open(self, part_name):
+        """Open a part for reading
+
+        :param part_name: Name of the part. e.g. 'visio/pages/page1.xml'
+        :return: Readable binary file object
+        """
+        return self.zip_file.open(part_name)
+
+    def names(self):
+        """Return the names of all parts in the package"""
+        return self.zip_file.namelist()
+
+    def raw_part(self, part_name):
+        """Read a part without decompressing it
+
+        :param part_name: Name of the part. e.g. 'visio/masters/master1.xml'
+        :return: Instance of :class:`RawPart`
+        """
+        info = self.zip_file.getinfo(part_name)
+        fp = self.zip_file.fp
+
+        with self.zip_file._lock:
+            # Skip the local file header, its name and extra field lengths
+            # can differ from the ones in the central directory
+            fp.seek(info.header_offset)
+            header = struct.unpack(zipfile.structFileHeader,
+                                   fp.read(zipfile.sizeFileHeader))
+            fp.seek(header[zipfile._FH_FILENAME_LENGTH] +
+                    header[zipfile._FH_EXTRA_FIELD_LENGTH], 1)
+            compressed = fp.read(info.compress_size)
+
+        return RawPart(info, compressed)
+
+    def read(self, part_name):
+        """Read a complete part
+
+        :param part_name: Name of the part. e.g. 'visio/pages/page1.xml'
+        :return: The part contents as bytes
+        """
+        return self.zip_file.read(part_name)
+
+    def close(self):
+        """Close the zip archive"""
+        self.zip_file.close()
+
+
+class RawPart:
+    """A part exactly as it is stored in a zip archive, still compressed"""
+
+    def __init__(self, info, compressed, level=None):
+        """Initialise the raw part
+
+        :param info: The zipfile.ZipInfo of the part in its source archive
+        :param compressed: The compressed bytes of the part
+        :param level: The zlib level or :data:`STORED` the part was
+                      compressed with, None when it comes from elsewhere
+        """
+        self.info = info
+        self.compressed = compressed
+        self.level = level
+
+    def read(self):
+        """Decompress the part
+
+        :return: The part contents as bytes
+        """
+        if self.info.compress_type == zipfile.ZIP_STORED:
+            return self.compressed
+        if self.info.compress_type == zipfile.ZIP_DEFLATED:
+            return zlib.decompress(self.compressed, -zlib.MAX_WBITS)
+        raise NotImplementedError('Compression type {} not supported'
+                                  .format(self.info.compress_type))
+
+
+class PartCompressor:
+    """Writable binary stream that deflates a part in memory
+
+    Lets a part be compressed away from the zip archive, e.g. in a worker
+    process, and added later with :meth:`PackageWriter.write_raw`.
+    """
+
+    def __init__(self, part_name, compresslevel=zlib.Z_DEFAULT_COMPRESSION):
+        """Initialise the compressor
+
+        :param part_name: Name of the part. e.g. 'visio/pages/page1.xml'
+        :param compresslevel: zlib compression level, or :data:`STORED` to
+                              keep the part uncompressed
+        """
+        self.part_name = part_name
+        self.level = compresslevel
+        if compresslevel == STORED:
+            self.compressor = None
+        else:
+            self.compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, -zlib.MAX_WBITS)
+        self.chunks = []
+        self.crc = 0
+        self.file_size = 0
+
+    def write(self, data):
+        self.crc = zlib.crc32(data, self.crc)
+        self.file_size += len(data)
+        if self.compressor is None:
+            self.chunks.append(bytes(data))
+        else:
+            self.chunks.append(self.compressor.compress(data))
+
+    def raw_part(self):
+        """Finish compressing
+
+        :return: Instance of :class:`RawPart`
+        """
+        info = zipfile.ZipInfo(self.part_name, time.localtime()[:6])
+        if self.compressor is None:
+            info.compress_type = zipfile.ZIP_STORED
+        else:
+            self.chunks.append(self.compressor.flush())
+            info.compress_type = zipfile.ZIP_DEFLATED
+        info.CRC = self.crc
+        info.file_size = self.file_size
+        return RawPart(info, b''.join(self.chunks), self.level)
+
+
+def compress_part(part_name, data, compresslevel=zlib.Z_DEFAULT_COMPRESSION):
+    """Deflate a complete part in memory
+
+    :param part_name: Name of the part. e.g. 'visio/masters/masters.xml'
+    :param data: The part contents as str or bytes
+    :param compresslevel: zlib compression level, or :data:`STORED` to keep
+                          the part uncompressed
+    :return: Instance of :class:`RawPart`
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    compressor = PartCompressor(part_name, compresslevel)
+    compressor.write(data)
+    return compressor.raw_part()
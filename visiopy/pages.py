@@ -8,8 +8,55 @@ This module handles Visio pages
 :copyright: (c) 2016 by Mathijs Mortimer.
 """
 
+import io
+import itertools
+import math
 import xml.etree.ElementTree as ET
 from relationships import Relationship
+from ids import IdAllocator
+from package import RawPart
+from geometry import get_geometry
+from shapestore import ShapeStore
+from graph import ConnectionGraph
+from spatial import (GridIndex, shape_bounds, shape_contains)
+import shapesheet
+from shapesheet import (Cell, Section, intern_attrs)
+from xmlutils import (element_xml, escape_attr, shape_xml, xml_attrs)
+
+XML_DECL = '<?xml version="1.0" encoding="utf-8" ?>'
+
+R_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+
+# Page attributes and PageSheet of pages added to a document, ID, NameU and
+# Name are filled in per page
+PAGE_ATTRS = (('ID', ''),
+              ('NameU', ''),
+              ('IsCustomNameU', '1'),
+              ('Name', ''),
+              ('IsCustomName', '1'),
+              ('ViewScale', '0.82'),
+              ('ViewCenterX', '4.1275082550165'),
+              ('ViewCenterY', '8.5852171704343'))
+
+PAGE_SHEET = ('<PageSheet LineStyle="0" FillStyle="0" TextStyle="0">'
+              '<Cell N="PageWidth" V="8.26771653543307"/>'
+              '<Cell N="PageHeight" V="11.69291338582677"/>'
+              '<Cell N="ShdwOffsetX" V="0.1181102362204724"/>'
+              '<Cell N="ShdwOffsetY" V="-0.1181102362204724"/>'
+              '<Cell N="PageScale" V="0.03937007874015748" U="MM"/>'
+              '<Cell N="DrawingScale" V="0.03937007874015748" U="MM"/>'
+              '<Cell N="DrawingSizeType" V="0"/>'
+              '<Cell N="DrawingScaleType" V="0"/>'
+              '<Cell N="InhibitSnap" V="0"/>'
+              '<Cell N="PageLockReplace" V="0" U="BOOL"/>'
+              '<Cell N="PageLockDuplicate" V="0" U="BOOL"/>'
+              '<Cell N="UIVisibility" V="0"/>'
+              '<Cell N="ShdwType" V="0"/>'
+              '<Cell N="ShdwObliqueAngle" V="0"/>'
+              '<Cell N="ShdwScaleFactor" V="1"/>'
+              '<Cell N="DrawingResizeType" V="1"/>'
+              '<Cell N="PageShapeSplit" V="1"/>'
+              '</PageSheet>')
 
 
 class PageCollection:
@@ -22,130 +69,213 @@ class PageCollection:
         :param content_types: Instance of :class:`ContentType`
         :param rels: Instance of :class:`Relationship` from pages.xml.rels
         :param pages: List of :class:`Page` classes
+        :param masters: Instance of :class:`DocumentMasters` the shapes on
+                        the pages inherit their cells from
         """
         self.content_types = content_types
         self.rels = kwargs.get('rels', Relationship())
         self.pages = kwargs.get('pages', [])
+        self.masters = kwargs.get('masters', None)
 
-    def add_page(self, name):
+        # Seed the ID counters once from the existing pages and rels
+        self.page_ids = IdAllocator(used=[page.id for page in self.pages])
+        self.rel_ids = IdAllocator(used=self.rels.rels)
+        self.filenames = IdAllocator(used=[page.filename for page in self.pages])
+
+        # Page lookup indexes, kept in sync by add_page, rm_page and rename_page
+        self.pages_by_rel_id = {}
+        self.pages_by_id = {}
+        self.pages_by_name = {}
+        for page in self.pages:
+            self._index(page)
+
+        # Set when pages.xml has to be generated again on the next save
+        self.dirty = True
+
+    @property
+    def masters(self):
+        """:class:`DocumentMasters` of the document, shared with every page"""
+        return self._masters
+
+    @masters.setter
+    def masters(self, masters):
+        self._masters = masters
+        for page in self.pages:
+            page.masters = masters
+
+    def _index(self, page):
+        self.pages_by_rel_id[page.rel_id] = page
+        self.pages_by_id[page.id] = page
+        self.pages_by_name[page.name] = page
+
+    def _unindex(self, page):
+        del self.pages_by_rel_id[page.rel_id]
+        del self.pages_by_id[page.id]
+        if self.pages_by_name.get(page.name) is page:
+            del self.pages_by_name[page.name]
+
+    def get_page(self, rel_id):
+        """Return the page with the given rel_id
+
+        :param rel_id: The rel_id of the page e.g: 'rId1'
+        :return: Instance of :class:`Page`
+        """
+        try:
+            return self.pages_by_rel_id[rel_id]
+        except KeyError:
+            raise KeyError('Page {} not found'.format(rel_id))
+
+    def get_page_by_id(self, id):
+        """Return the page with the given page ID
+
+        :param id: The ID of the page e.g: '0'
+        :return: Instance of :class:`Page`
+        """
+        try:
+            return self.pages_by_id[str(id)]
+        except KeyError:
+            raise KeyError('Page ID {} not found'.format(id))
+
+    def get_page_by_name(self, name):
+        """Return the page with the given name
+
+        :param name: The name of the page
+        :return: Instance of :class:`Page`
+        """
+        try:
+            return self.pages_by_name[name]
+        except KeyError:
+            raise KeyError('Page name {} not found'.format(name))
+
+    def rename_page(self, rel_id, name):
+        """Rename a page and keep the name index up to date
+
+        :param rel_id: The rel_id of the page e.g: 'rId1'
+        :param name: The new name of the page
+        """
+        page = self.get_page(rel_id)
+        self._unindex(page)
+        page.name = name
+        self._index(page)
+        self.dirty = True
+
+    def add_page(self, name, columnar=False):
         """Add a page to the collection
         
         :param name: The name of the page
+        :param columnar: Keep the shapes of the page in a :class:`ShapeStore`
         :return: rel_id e.g: 'rId1'
         """
+        filename = 'page{}.xml'.format(self.filenames.allocate())
+        rel_id = 'rId{}'.format(self.rel_ids.allocate())
+        id = str(self.page_ids.allocate())
 
-        filename = 0
-        rel_id = 0
-        id = 0
+        self.rels.add(rel_id, filename, 'http://schemas.microsoft.com/visio/2010/relationships/page')
+        self.content_types.add('/visio/pages/{}'.format(filename), 'application/vnd.ms-visio.page+xml')
+        page = Page(filename, id, rel_id, name=name, columnar=columnar,
+                    masters=self.masters)
+        self.pages.append(page)
+        self._index(page)
+        self.dirty = True
+        return rel_id
 
-        for page in self.pages:
-            if int(page.rel_id.lstrip('rId')) >= rel_id:
-                rel_id = int(page.rel_id.strip('rId'))
-            if int(page.filename.lstrip('page').strip('.xml')) >= filename:
-                filename = int(page.filename.lstrip('page').strip('.xml'))
-            if int(page.id) >= id:
-                id = int(page.id)
+    def rm_page(self, rel_id):
+        """Remove a page from the collection
 
-        filename += 1
-        rel_id += 1
-        id += 1
+        The ID, rel_id and filename of the page are not handed out again.
 
-        filename = 'page{}.xml'.format(filename)
-        rel_id = 'rId{}'.format(rel_id)
-        id = str(id)
+        :param rel_id: The rel_id of the page e.g: 'rId1'
+        """
+        page = self.get_page(rel_id)
 
-        self.rels.add(rel_id, filename, 'http://schemas.microsoft.com/visio/2010/relationships/page')
-        self.content_types.add('/visio/pages/{}'.format(filename), 'application/vnd.ms-visio.page+xml')
-        self.pages.append(Page(filename,
-                               id,
-                               rel_id,
-                               name=name))
-        return rel_id
+        self.pages.remove(page)
+        self._unindex(page)
+        self.rels.rm(rel_id)
+        self.content_types.rm('/visio/pages/{}'.format(page.filename))
+        self.dirty = True
 
     def add_shape(self, page_rel_id, **kwargs):
         """Add a shape to the given page rel_id"""
-        for page in self.pages:
-            if page.rel_id == page_rel_id:
-                return page.add_shape(**kwargs)
+        return self.get_page(page_rel_id).add_shape(**kwargs)
+
+    def add_shapes(self, page_rel_id, **columns):
+        """Add a batch of shapes to the given page rel_id"""
+        return self.get_page(page_rel_id).add_shapes(**columns)
 
-        raise KeyError('Page {} not found'.format(page_rel_id))
+    def add_connect(self, page_rel_id, shape1, shape2):
+        """Connect two shapes on the given page rel_id"""
+        return self.get_page(page_rel_id).add_connect(shape1, shape2)
 
     @classmethod
-    def from_xml(cls, dir, content_types):
-        """Generate PageCollection from files
+    def from_xml(cls, package, content_types, lazy=True):
+        """Generate PageCollection from a visio package
 
-        :param dir: The directory of the extracted visio package
+        :param package: Instance of :class:`PackageReader`
         :param content_types: Instance of :class:`ContentType`
+        :param lazy: Only parse the pages when their shapes or connects
+                     are first accessed
         """
 
-        rel_dir = '{}/visio/pages/_rels/'.format(dir)
-        page_dir = '{}/visio/pages/'.format(dir)
+        page_dir = 'visio/pages/'
         pages = []
 
-        rels = Relationship.from_xml(rel_dir + 'pages.xml.rels')
+        with package.open(page_dir + '_rels/pages.xml.rels') as f:
+            rels = Relationship.from_xml(f)
 
         # Parse pages.xml for page info
-        tree = ET.parse(page_dir + 'pages.xml')
+        with package.open(page_dir + 'pages.xml') as f:
+            tree = ET.parse(f)
         root = tree.getroot()
 
         for child in root:
-            name = child.attrib.get('Name', '')
-            id = child.attrib['ID']
-            # TODO Parse these namespaces properly
-            rel_id = child[1].attrib['{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id']
-            pages.append(Page.from_xml(page_dir + rels.rels[rel_id][0],
-                                       name, id, rel_id))
-
-        return cls(content_types, rels=rels, pages=pages)
+            rel = child.find(shapesheet.ns + 'Rel')
+            rel_id = rel.get(R_NS + 'id')
+            filename = rels.rels[rel_id][0]
+            # Keep the page element as it was read, only new pages get the
+            # default page setup
+            info = {'name': child.get('Name', ''),
+                    'attrs': dict(child.items()),
+                    'page_sheet': ''.join(element_xml(item) for item in child if item is not rel)}
+            id = child.get('ID')
+            if lazy:
+                pages.append(Page(filename, id, rel_id,
+                                  source=package.raw_part(page_dir + filename), **info))
+            else:
+                with package.open(page_dir + filename) as f:
+                    pages.append(Page.from_xml(f, info.pop('name'), id, rel_id,
+                                               filename=filename, **info))
+
+        page_collection = cls(content_types, rels=rels, pages=pages)
+        page_collection.dirty = False
+        return page_collection
 
     def to_xml(self):
         """Generate XML data for pages
 
+        Pages read from a package keep their own Page attributes and
+        PageSheet, only the ID and a changed name are written over.
+
         :return: XML string for (pages.xml, pages.xml.rels)
         """
-        root = ET.Element('Pages', {'xmlns': 'http://schemas.microsoft.com/office/visio/2012/main',
-                                    'xmlns:r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships',
-                                    'xml:space': 'preserve'})
+        xml = ['<Pages xmlns="http://schemas.microsoft.com/office/visio/2012/main"'
+               ' xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"'
+               ' xml:space="preserve">']
 
         for page in self.pages:
-            xml_page = ET.SubElement(root,
-                                     'Page',
-                                     {'ID': page.id,
-                                      'NameU': page.name,
-                                      'IsCustomNameU': '1',
-                                      'Name': page.name,
-                                      'IsCustomName': '1',
-                                      'ViewScale': '0.82',
-                                      'ViewCenterX': '4.1275082550165',
-                                      'ViewCenterY': '8.5852171704343'})
-
-            xml_pagesheet = ET.SubElement(xml_page,
-                                          'PageSheet',
-                                          {'LineStyle': '0',
-                                           'FillStyle': '0',
-                                           'TextStyle': '0'})
-
-            ET.SubElement(xml_pagesheet, 'Cell', {'N': 'PageWidth', 'V': '8.26771653543307'})
-            ET.SubElement(xml_pagesheet, 'Cell', {'N': 'PageHeight', 'V': '11.69291338582677'})
-            ET.SubElement(xml_pagesheet, 'Cell', {'N': 'ShdwOffsetX', 'V': '0.1181102362204724'})
-            ET.SubElement(xml_pagesheet, 'Cell', {'N': 'ShdwOffsetY', 'V': '-0.1181102362204724'})
-            ET.SubElement(xml_pagesheet, 'Cell', {'N': 'PageScale', 'V': '0.03937007874015748', 'U': 'MM'})
-            ET.SubElement(xml_pagesheet, 'Cell', {'N': 'DrawingScale', 'V': '0.03937007874015748', 'U': 'MM'})
-            ET.SubElement(xml_pagesheet, 'Cell', {'N': 'DrawingSizeType', 'V': '0'})
-            ET.SubElement(xml_pagesheet, 'Cell', {'N': 'DrawingScaleType', 'V': '0'})
-            ET.SubElement(xml_pagesheet, 'Cell', {'N': 'InhibitSnap', 'V': '0'})
-            ET.SubElement(xml_pagesheet, 'Cell', {'N': 'PageLockReplace', 'V': '0', 'U': 'BOOL'})
-            ET.SubElement(xml_pagesheet, 'Cell', {'N': 'PageLockDuplicate', 'V': '0', 'U': 'BOOL'})
-            ET.SubElement(xml_pagesheet, 'Cell', {'N': 'UIVisibility', 'V': '0'})
-            ET.SubElement(xml_pagesheet, 'Cell', {'N': 'ShdwType', 'V': '0'})
-            ET.SubElement(xml_pagesheet, 'Cell', {'N': 'ShdwObliqueAngle', 'V': '0'})
-            ET.SubElement(xml_pagesheet, 'Cell', {'N': 'ShdwScaleFactor', 'V': '1'})
-            ET.SubElement(xml_pagesheet, 'Cell', {'N': 'DrawingResizeType', 'V': '1'})
-            ET.SubElement(xml_pagesheet, 'Cell', {'N': 'PageShapeSplit', 'V': '1'})
-
-            ET.SubElement(xml_page, 'Rel', {'r:id': page.rel_id})
-
-        pages_xml = ET.tostring(root, encoding='unicode')
+            if page.attrs is None:
+                attrs = dict(PAGE_ATTRS, ID=page.id, NameU=page.name, Name=page.name)
+            else:
+                attrs = dict(page.attrs, ID=page.id)
+                if attrs.get('Name') != page.name:
+                    attrs.update(NameU=page.name, IsCustomNameU='1',
+                                 Name=page.name, IsCustomName='1')
+
+            page_sheet = PAGE_SHEET if page.page_sheet is None else page.page_sheet
+            xml.append('<Page{}>{}<Rel r:id="{}"/></Page>'.format(
+                xml_attrs(attrs.items()), page_sheet, escape_attr(page.rel_id)))
+
+        xml.append('</Pages>')
+        pages_xml = ''.join(xml)
         pages_xml_rels = self.rels.to_xml()
 
         return pages_xml, pages_xml_rels
@@ -161,202 +291,892 @@ class Page:
 
         :param shapes: List of :class:`Shape` classes
         :param connects: List of :class:`Connect` classes
+        :param source: Raw bytes or :class:`RawPart` of an existing
+                       page?.xml part. When given the shapes and connects
+                       are only parsed on first access, until then the
+                       source is saved untouched
+        :param columnar: Keep the shapes in a :class:`ShapeStore` instead of
+                         a list of :class:`Shape` objects
+        :param attrs: dict of the attributes of the Page element in
+                      pages.xml, None for the defaults of a new page
+        :param page_sheet: XML string of the children of the Page element in
+                           pages.xml except Rel, None for the default
+                           PageSheet of a new page
+        :param masters: Instance of :class:`DocumentMasters` the shapes
+                        inherit their cells from
         """
         self.filename = filename
         self.id = id
         self.rel_id = rel_id
         self.name = kwargs.get('name', '')
-        self.shapes = kwargs.get('shapes', [])
-        self.connects = kwargs.get('connects', [])
+        self.attrs = kwargs.get('attrs', None)
+        self.page_sheet = kwargs.get('page_sheet', None)
+        self.masters = kwargs.get('masters', None)
+        self.source = kwargs.get('source', None)
+        self._shapes = kwargs.get('shapes', [])
+        if kwargs.get('columnar', False):
+            self._shapes = ShapeStore(Shape.defaults, self._shapes)
+        self._connects = kwargs.get('connects', [])
+        self._shape_ids = None
+        self._spatial_index = None
+        self._connection_graph = None
+        self._adopt(self._shapes)
+
+        # The compressed page?.xml part as last read or saved, written
+        # again as it is while the page is not dirty
+        self.saved = self.source if isinstance(self.source, RawPart) else None
+        self.dirty = self.saved is None
+
+    def __getstate__(self):
+        # Pages going to a worker process are only serialised there, leave
+        # the masters, the indexes and the saved part behind
+        state = dict(self.__dict__)
+        state.update(masters=None, saved=None, _shape_ids=None,
+                     _spatial_index=None, _connection_graph=None)
+        return state
+
+    @property
+    def loaded(self):
+        """True when the shapes and connects of the page are parsed"""
+        return self.source is None
+
+    @property
+    def shapes(self):
+        if not self.loaded:
+            self.load()
+        return self._shapes
+
+    @shapes.setter
+    def shapes(self, shapes):
+        # Parse the page first, its connects would be lost otherwise
+        if not self.loaded:
+            self.load()
+        self._shapes = shapes
+        self._shape_ids = None
+        self._spatial_index = None
+        self._adopt(shapes)
+        self.mark_dirty()
+
+    @property
+    def connects(self):
+        if not self.loaded:
+            self.load()
+        return self._connects
+
+    @connects.setter
+    def connects(self, connects):
+        # Parse the page first, its shapes would be lost otherwise
+        if not self.loaded:
+            self.load()
+        self._connects = connects
+        self._connection_graph = None
+        self.mark_dirty()
+
+    @property
+    def shape_ids(self):
+        """:class:`IdAllocator` for the shapes on this page
+
+        Seeded from the shapes on the page on first use.
+        """
+        if self._shape_ids is None:
+            self._shape_ids = IdAllocator(used=[shape.id for shape in walk_shapes(self.shapes)])
+        return self._shape_ids
+
+    @property
+    def spatial_index(self):
+        """:class:`GridIndex` over the bounding boxes of the top level shapes
+
+        Built in one pass on first use and kept up to date as shapes are
+        added, changed or removed through the page. Master instances are
+        placed with the cells they inherit from their master. Shapes whose
+        position or size is known neither from the shape nor from a master
+        of the document are left out.
+        """
+        if self._spatial_index is None:
+            entries = []
+            for shape in self.shapes:
+                bounds = shape_bounds(shape, self.master_shape(shape))
+                if bounds is not None:
+                    entries.append((str(shape.id), shape, bounds))
+            self._spatial_index = GridIndex.from_items(entries)
+        return self._spatial_index
+
+    @property
+    def connection_graph(self):
+        """:class:`ConnectionGraph` over the connects of this page
+
+        Built in one pass on first use and kept up to date by
+        :meth:`add_connect`. Assigning :attr:`connects` discards it.
+        """
+        if self._connection_graph is None:
+            self._connection_graph = ConnectionGraph(self.connects)
+        return self._connection_graph
+
+    def _adopt(self, shapes):
+        """Let shapes, including the shapes nested in groups, report their
+        changes to this page"""
+        if isinstance(shapes, ShapeStore):
+            shapes.owner = self
+            return
+
+        for shape in shapes:
+            shape.page = self
+            for sub_shape in getattr(shape, 'shapes', ()):
+                sub_shape.group = shape
+                self._adopt([sub_shape])
+
+    def master_shape(self, shape):
+        """Return the master shape a shape inherits its cells from
+
+        :param shape: A shape of this page
+        :return: Instance of :class:`SheetShape`, or None when the shape is
+                 not a master instance or the master is not available
+        """
+        attrs = getattr(shape, 'attrs', None)
+        if self.masters is None or not attrs or 'Master' not in attrs:
+            return None
+        return self.masters.shape(attrs['Master'])
+
+    def cell_value(self, shape, name):
+        """Return a shape attribute, taken from the master when inherited
+
+        Attributes of a :class:`SheetShape` read None for cells the shape
+        does not set itself, this looks them up on its master shape.
+
+        :param shape: A top level shape of this page
+        :param name: The name of the attribute e.g. 'width'
+        :return: The value, or None when neither the shape nor its master
+                 sets the cell
+        """
+        value = getattr(shape, name)
+        if value is None:
+            master = self.master_shape(shape)
+            if master is not None:
+                value = getattr(master, name)
+        return value
+
+    def mark_dirty(self):
+        """Flag the page for serialising on the next save
+
+        Changes made through the page and shape APIs do this already, call
+        it after changing the shapes or connects any other way, e.g. by
+        editing :class:`Cell` objects directly.
+        """
+        self.dirty = True
+
+    def shape_changed(self, shape):
+        """Called by a shape of this page after it changed
+
+        :param shape: The :class:`Shape` or :class:`ShapeView` that changed
+        """
+        self.dirty = True
+        if self._spatial_index is not None and getattr(shape, 'group', None) is None:
+            bounds = shape_bounds(shape, self.master_shape(shape))
+            if bounds is None:
+                self._spatial_index.remove(str(shape.id))
+            else:
+                self._spatial_index.insert(str(shape.id), shape, bounds)
+
+    def query_region(self, x0, y0, x1, y1, contained=False):
+        """Return the top level shapes within a region of the page
+
+        :param x0: Left edge of the region
+        :param y0: Bottom edge of the region
+        :param x1: Right edge of the region
+        :param y1: Top edge of the region
+        :param contained: Only return shapes lying completely within the
+                          region instead of all shapes overlapping it
+        :return: List of shapes
+        """
+        x0, x1 = min(x0, x1), max(x0, x1)
+        y0, y1 = min(y0, y1), max(y0, y1)
+        return [shape for shape, bounds in self.spatial_index.query(x0, y0, x1, y1, contained)]
+
+    def hit_test(self, x, y):
+        """Return the top level shapes under a point of the page
+
+        :param x: Horizontal position on the page
+        :param y: Vertical position on the page
+        :return: List of shapes
+        """
+        return [shape for shape, bounds in self.spatial_index.query(x, y, x, y)
+                if shape_contains(shape, x, y, self.master_shape(shape))]
+
+    def overlapping(self, shape):
+        """Return the other top level shapes whose bounds overlap a shape
+
+        :param shape: A shape of this page
+        :return: List of shapes
+        """
+        bounds = shape_bounds(shape, self.master_shape(shape))
+        if bounds is None:
+            return []
+        return [other for other, other_bounds in self.spatial_index.query(*bounds)
+                if str(other.id) != str(shape.id)]
+
+    def load(self):
+        """Parse the shapes and connects from the page source"""
+        self._shapes, self._connects = self.parse(io.BytesIO(self.source_bytes()))
+        self.source = None
+        self._adopt(self._shapes)
+
+    def source_bytes(self):
+        """Return the uncompressed page source"""
+        if isinstance(self.source, RawPart):
+            return self.source.read()
+        return self.source
 
     def add_shape(self, **kwargs):
         """Add a shape to the Page
         
         :return: id of the shape (is localised to the current page)
         """
-        new_id = 1
+        new_id = self.shape_ids.allocate()
+        shape = Shape(new_id, **kwargs)
+        shapes = self.shapes
+        shapes.append(shape)
+        if isinstance(shapes, ShapeStore):
+            # The store keeps a copy, index the row instead of the shape
+            shape = shapes[-1]
+        else:
+            shape.page = self
+        self.shape_changed(shape)
+        return new_id
+
+    def add_shapes(self, **columns):
+        """Add a batch of shapes to the Page in one call
+
+        Every keyword is a column of :class:`Shape` keyword values, e.g.
+        pin_x=[1.0, 2.0], pin_y=[5.0, 5.0]. Columns can be lists, tuples,
+        NumPy arrays or any other sequence, and all need the same length.
+        A scalar is used for every shape in the batch.
+
+        :return: range of the ids of the new shapes
+        """
+        count = None
+        for name, column in columns.items():
+            if isinstance(column, (str, bytes)) or not hasattr(column, '__len__'):
+                continue
+            if count is None:
+                count = len(column)
+            elif len(column) != count:
+                raise ValueError('Column {} has {} values, expected {}'
+                                 .format(name, len(column), count))
+
+        if count is None:
+            raise ValueError('add_shapes needs at least one sequence column')
+
+        names = list(columns)
+        values = [as_column(columns[name], count) for name in names]
+
+        new_ids = self.shape_ids.allocate_range(count)
+        if isinstance(self.shapes, ShapeStore):
+            self.shapes.add_columns(new_ids, **dict(zip(names, values)))
+            new_shapes = self.shapes[-count:]
+        else:
+            new_shapes = [Shape(new_id, **dict(zip(names, row)))
+                          for new_id, row in zip(new_ids, zip(*values))]
+            self.shapes.extend(new_shapes)
+            self._adopt(new_shapes)
+
+        self.mark_dirty()
+        if self._spatial_index is not None:
+            for shape in new_shapes:
+                self.shape_changed(shape)
+        return new_ids
+
+    def move_shapes(self, dx=0.0, dy=0.0):
+        """Move all top level shapes on the page
+
+        Columnar pages move all shapes in one vectorised operation. Cells
+        inherited from a master are resolved with :meth:`cell_value` and
+        set on the shape, cells without a known value are left as they are.
+
+        :param dx: Offset added to every PinX
+        :param dy: Offset added to every PinY
+        """
+        if isinstance(self.shapes, ShapeStore):
+            self.shapes.move(dx, dy)
+            self._spatial_index = None
+            self.mark_dirty()
+            return
 
         for shape in self.shapes:
-            if shape.id >= new_id:
-                new_id += 1
+            for name, offset in (('pin_x', dx), ('pin_y', dy)):
+                value = self.cell_value(shape, name)
+                if value is not None:
+                    setattr(shape, name, value + offset)
 
-        self.shapes.append(Shape(new_id, **kwargs))
-        return new_id
+    def scale_shapes(self, fx=1.0, fy=1.0):
+        """Scale all top level shapes on the page around the page origin
+
+        Columnar pages scale all shapes in one vectorised operation. Cells
+        are resolved as in :meth:`move_shapes`.
+
+        :param fx: Factor applied to the horizontal positions and sizes
+        :param fy: Factor applied to the vertical positions and sizes
+        """
+        if isinstance(self.shapes, ShapeStore):
+            self.shapes.scale(fx, fy)
+            self._spatial_index = None
+            self.mark_dirty()
+            return
+
+        factors = (('pin_x', fx), ('width', fx), ('loc_pin_x', fx),
+                   ('pin_y', fy), ('height', fy), ('loc_pin_y', fy))
+        for shape in self.shapes:
+            for name, factor in factors:
+                value = self.cell_value(shape, name)
+                if value is not None:
+                    setattr(shape, name, value * factor)
+
+    def rm_shape(self, id):
+        """Remove a top level shape from the Page
+
+        The ID of the shape is not handed out again.
+
+        :param id: The ID of the shape
+        """
+        for shape in self.shapes:
+            if str(shape.id) == str(id):
+                self.shapes.remove(shape)
+                self.mark_dirty()
+                if isinstance(self.shapes, ShapeStore):
+                    # Removing a row shifts the views, rebuild on next use
+                    self._spatial_index = None
+                    return
+
+                shape.page = None
+                if self._spatial_index is not None:
+                    self._spatial_index.remove(str(id))
+                return
+
+        raise KeyError('Shape {} not found'.format(id))
+
+    def get_shape(self, id):
+        """Return the top level shape with the given ID
+
+        :param id: The ID of the shape
+        :return: Instance of :class:`Shape` or :class:`ShapeView`
+        """
+        for shape in self.shapes:
+            if str(shape.id) == str(id):
+                return shape
+        raise KeyError('Shape {} not found'.format(id))
 
     def add_connect(self, shape1, shape2):
-        """Add connect between two shapes
+        """Connect two shapes with a straight 1-D connector
+
+        The connector is a new shape running from the pin of the first
+        shape to the pin of the second. Its begin is glued to the first
+        shape and its end to the second, by a Connect each.
 
         :param shape1: the ID of the first shape
         :param shape2: the ID of the second shape
+        :return: id of the connector shape
         """
-        new_id = 1
-
-        for connect in self.connects:
-            if connect.id >= new_id:
-                new_id += 1
-
-        self.connects.append(Connect(new_id, **kwargs))
+        if isinstance(self.shapes, ShapeStore):
+            raise NotImplementedError('Connectors are not supported on columnar pages')
+
+        ends = []
+        for id in (shape1, shape2):
+            shape = self.get_shape(id)
+            ends.append((self.cell_value(shape, 'pin_x') or 0.0,
+                         self.cell_value(shape, 'pin_y') or 0.0))
+
+        new_id = self.shape_ids.allocate()
+        connector = connector_shape(new_id, shape1, shape2, *ends)
+        self.shapes.append(connector)
+        connector.page = self
+        self.shape_changed(connector)
+
+        for from_cell, from_part, to_sheet in (('BeginX', '9', shape1), ('EndX', '12', shape2)):
+            connect = Connect(FromSheet=str(new_id), FromCell=from_cell, FromPart=from_part,
+                              ToSheet=str(to_sheet), ToCell='PinX', ToPart='3')
+            self.connects.append(connect)
+            if self._connection_graph is not None:
+                self._connection_graph.add_connect(connect)
         return new_id
 
     def to_xml(self):
-        """Writes Page object to page?.xml file"""
-        # TODO: the to_xml functions all around shouldn't write to file
-        # but just spit out the xml as a string. Then I can have this
-        # function for each object like Shape, Connect, etc. This will
-        # allow me to inject these objects into the Page.to_xml()
-        # function to create the full picture
-        # pheww, this is going to be a lot of work until i figured
-        # all the types out!
-
-        root = ET.Element('PageContents', {'xmlns': 'http://schemas.microsoft.com/office/visio/2012/main',
-                                           'xmlns:r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships',
-                                           'xml:space': 'preserve'})
+        """Generate XML data for the page?.xml file
+
+        :return: XML string
+        """
+        return ''.join(self.iter_xml())
+
+    def iter_xml(self):
+        """Generate the XML data of the page in chunks
+
+        The page is serialised shape by shape, no element tree is built
+        for the page as a whole.
+
+        :return: generator of XML strings
+        """
+        yield ('<PageContents xmlns="http://schemas.microsoft.com/office/visio/2012/main"'
+               ' xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"'
+               ' xml:space="preserve">')
+
         if self.shapes:
-            xml_shapes = ET.SubElement(root, 'Shapes')
-            for shape in self.shapes:
-                xml_shapes.append(ET.fromstring(shape.to_xml()))
+            yield '<Shapes>'
+            if isinstance(self.shapes, ShapeStore):
+                yield from self.shapes.iter_xml()
+            else:
+                for shape in self.shapes:
+                    yield shape.to_xml()
+            yield '</Shapes>'
 
         if self.connects:
-            xml_connects = ET.SubElement(root, 'Connects')
+            yield '<Connects>'
             for connect in self.connects:
-                xml_connects.append(ET.fromstring(connect.to_xml()))
+                yield connect.to_xml()
+            yield '</Connects>'
+
+        yield '</PageContents>'
+
+    def write_xml(self, stream, chunk_size=1024):
+        """Write the complete page?.xml part to a binary stream
+
+        A page that was never loaded writes its source untouched. Otherwise
+        the XML is written incrementally, chunk_size shapes at a time.
 
-        return ET.tostring(root, encoding='unicode')
+        :param stream: Writable binary file object
+        :param chunk_size: The number of XML chunks joined per write
+        """
+        if not self.loaded:
+            stream.write(self.source_bytes())
+            return
+
+        chunk = [XML_DECL]
+        for xml in self.iter_xml():
+            chunk.append(xml)
+            if len(chunk) >= chunk_size:
+                stream.write(''.join(chunk).encode('utf-8'))
+                chunk = []
+        stream.write(''.join(chunk).encode('utf-8'))
 
     @classmethod
-    def from_xml(cls, xml_file, name, id, rel_id):
-        """Create a Page object from an existing xml_file"""
+    def from_xml(cls, xml_file, name, id, rel_id, filename=None, **kwargs):
+        """Create a Page object from an existing xml_file
+
+        :param xml_file: Filename or file object of the page?.xml part
+        :param filename: Name of the part within visio/pages, taken from
+                         xml_file when it is a filename
+        :param kwargs: Further keyword arguments of :class:`Page`, e.g.
+                       attrs and page_sheet
+        """
 
-        if '/' in xml_file:
-            filename = xml_file.rsplit('/', 1)[1]
-        else:
-            filename = xml_file
+        if filename is None:
+            filename = xml_file.rsplit('/', 1)[-1]
+
+        shapes, connects = cls.parse(xml_file)
+
+        return cls(filename, id, rel_id, name=name, shapes=shapes, connects=connects, **kwargs)
+
+    @classmethod
+    def iterparse(cls, xml_file):
+        """Stream the top level shapes and connects of a page?.xml file
+
+        Built on ElementTree.iterparse, every shape or connect is yielded as
+        soon as its element is complete and its element is dropped right
+        after, so only a single shape is held in memory at a time.
+
+        :param xml_file: Filename or file object of the page?.xml part
+        :return: generator of :class:`Shape` and :class:`Connect` objects
+                 in document order
+        """
+        shapes_tag = '{%s}Shapes' % cls.ns['visio']
+        connects_tag = '{%s}Connects' % cls.ns['visio']
+
+        # Depth 1 is PageContents, 2 the Shapes/Connects containers and 3
+        # the items we yield
+        depth = 0
+        container = None
+        for event, elem in ET.iterparse(xml_file, events=('start', 'end')):
+            if event == 'start':
+                depth += 1
+                if depth == 2:
+                    container = elem
+                continue
+
+            depth -= 1
+            if depth == 2:
+                if container.tag == shapes_tag:
+                    yield Shape.from_xml(elem)
+                elif container.tag == connects_tag:
+                    yield Connect.from_xml(elem)
+                container.remove(elem)
+            elif depth == 1:
+                container.clear()
 
+    @classmethod
+    def iter_shapes(cls, xml_file):
+        """Stream the top level shapes of a page?.xml file
+
+        :param xml_file: Filename or file object of the page?.xml part
+        :return: generator of :class:`Shape` objects
+        """
+        for item in cls.iterparse(xml_file):
+            if isinstance(item, Shape):
+                yield item
+
+    @classmethod
+    def iter_connects(cls, xml_file):
+        """Stream the connects of a page?.xml file
+
+        :param xml_file: Filename or file object of the page?.xml part
+        :return: generator of :class:`Connect` objects
+        """
+        for item in cls.iterparse(xml_file):
+            if isinstance(item, Connect):
+                yield item
+
+    @classmethod
+    def parse(cls, xml_file):
+        """Parse the shapes and connects of a page?.xml file
+
+        The whole page is parsed at once, which is faster than streaming
+        it with :meth:`iterparse` when all of it is kept anyway.
+
+        :param xml_file: Filename or file object of the page?.xml part
+        :return: tuple of (shapes, connects)
+        """
         shapes = []
         connects = []
 
-        # Parse main page?.xml file
-        tree = ET.parse(xml_file)
-        root = tree.getroot()
-
+        root = ET.parse(xml_file).getroot()
         for items in root.findall('visio:Shapes', cls.ns):
-            for item in items:
-                shapes.append(Shape.from_xml(item))
-
+            shapes.extend(Shape.from_xml(item) for item in items)
         for items in root.findall('visio:Connects', cls.ns):
-            for item in items:
-                connects.append(Connect.from_xml(item))
+            connects.extend(Connect.from_xml(item) for item in items)
+
+        return shapes, connects
+
+
+def as_column(values, count):
+    """Return a column of values as a plain python sequence
+
+    NumPy arrays are converted to lists of python numbers, scalars are
+    repeated count times.
 
-        return cls(filename, id, rel_id, name=name, shapes=shapes, connects=connects)
+    :param values: A sequence or a scalar
+    :param count: The length of the column
+    """
+    if isinstance(values, (str, bytes)) or not hasattr(values, '__len__'):
+        return itertools.repeat(values, count)
+    if hasattr(values, 'tolist'):
+        return values.tolist()
+    return values
+
+
+def walk_shapes(shapes):
+    """Iterate over shapes including the shapes nested in groups
+
+    :param shapes: List of :class:`Shape` classes
+    """
+    for shape in shapes:
+        yield shape
+        for sub_shape in walk_shapes(getattr(shape, 'shapes', ())):
+            yield sub_shape
 
 
 class Shape:
-    """Contains a single shape object"""
+    """Contains a single shape object
+
+    Shapes loaded from a file are :class:`SheetShape` objects, their
+    attributes read None for cells they inherit, e.g. from a master. Use
+    :meth:`Page.cell_value` where a value is needed for every shape.
+    """
+
+    # Default values of the shape keyword arguments. loc_pin_x and
+    # loc_pin_y default to the center of the shape.
+    defaults = {'type': 'Shape',
+                'line_style': 3,
+                'fill_style': 3,
+                'text_style': 3,
+                'pin_x': 5.0,
+                'pin_y': 5.0,
+                'width': 5.0,
+                'height': 5.0,
+                'angle': 0,
+                'flip_x': False,
+                'flip_y': False,
+                'resize_mode': 0,
+                'geometry': 'rectangle'}
+
+    # The page the shape belongs to, set once the shape is added to a page
+    page = None
+    # The group shape a nested shape belongs to
+    group = None
+    # Attributes whose changes are not reported to the page by
+    # __setattr__, e.g. because their setter reports them already
+    quiet_attributes = frozenset(('page', 'group'))
 
     def __init__(self, id, **kwargs):
 
-        self.id = id
-        self.type = kwargs.get('type', 'Shape')
-        self.line_style = kwargs.get('line_style', 3)
-        self.fill_style = kwargs.get('fill_style', 3)
-        self.text_style = kwargs.get('text_style', 3)
-        self.pin_x = kwargs.get('pin_x', 5.0)
-        self.pin_y = kwargs.get('pin_y', 5.0)
-        self.width = kwargs.get('width', 5.0)
-        self.height = kwargs.get('height', 5.0)
-        self.angle = kwargs.get('angle', 0)
-        self.flip_x = kwargs.get('flip_x', False)
-        self.flip_y = kwargs.get('flip_y', False)
-        self.resize_mode = kwargs.get('resize_mode', 0)
-        self.loc_pin_x = kwargs.get('loc_pin_x', self.width*0.5)
-        self.loc_pin_y = kwargs.get('loc_pin_y', self.height*0.5)
+        # Filled through __dict__, there is no page to notify yet
+        values = {'id': id}
+        for name, default in self.defaults.items():
+            values[name] = kwargs.get(name, default)
+        values['loc_pin_x'] = kwargs.get('loc_pin_x', values['width']*0.5)
+        values['loc_pin_y'] = kwargs.get('loc_pin_y', values['height']*0.5)
+        self.__dict__.update(values)
+
+    def __setattr__(self, name, value):
+        """Set an attribute and report the change to the page of the shape"""
+        object.__setattr__(self, name, value)
+        page = self.page
+        if page is not None and name not in self.quiet_attributes:
+            page.shape_changed(self)
 
     @classmethod
     def from_xml(cls, xml_shape):
         """Initialise the shape from xml into python object
 
         :param xml_shape: the shape from xml.etree.ElementTree
+        :return: Instance of :class:`SheetShape`
         """
+        return SheetShape.from_xml(xml_shape)
 
-        # TODO Parse this shizzle
-        # you can have Cells, section and shapes
-        #tree = ET.parse(xml_shape)
-        root = xml_shape
+    def to_xml(self):
+        """Generate XML data for the shape
 
-        id = root.attrib['ID']
-        type = root.attrib['Type']
-        line_style = root.attrib.get('LineStyle', None)
-        fill_style = root.attrib.get('FillStyle', None)
-        text_style = root.attrib.get('TextStyle', None)
+        :return: XML string
+        """
+        return shape_xml(self.id, self.type, self.line_style, self.fill_style,
+                         self.text_style, self.pin_x, self.pin_y, self.width,
+                         self.height, self.loc_pin_x, self.loc_pin_y, self.angle,
+                         self.flip_x, self.flip_y, self.resize_mode,
+                         get_geometry(self.geometry))
+
+
+class SheetShape(Shape):
+    """A shape loaded from an existing page?.xml file
+
+    Keeps every attribute, cell, section and nested shape of the XML, so the
+    shape is written back as it was read. The :class:`Shape` attributes read
+    and write the matching ShapeSheet cells. Cells that are not set on the
+    shape itself, e.g. because they are inherited from a master, read as
+    None.
+    """
+
+    # Shape attributes stored as attributes of the Shape element
+    sheet_attributes = {'id': 'ID',
+                        'type': 'Type',
+                        'line_style': 'LineStyle',
+                        'fill_style': 'FillStyle',
+                        'text_style': 'TextStyle'}
+
+    # Shape attributes stored as cells, with the function decoding the value
+    cell_attributes = {'pin_x': ('PinX', float),
+                       'pin_y': ('PinY', float),
+                       'width': ('Width', float),
+                       'height': ('Height', float),
+                       'loc_pin_x': ('LocPinX', float),
+                       'loc_pin_y': ('LocPinY', float),
+                       'angle': ('Angle', float),
+                       'flip_x': ('FlipX', lambda value: bool(float(value))),
+                       'flip_y': ('FlipY', lambda value: bool(float(value))),
+                       'resize_mode': ('ResizeMode', lambda value: int(float(value)))}
+
+    # The cell properties report their changes through set_cell
+    quiet_attributes = Shape.quiet_attributes | frozenset(cell_attributes)
+
+    geometry = None
+
+    def __init__(self, attrs, children):
+        """Initialise the shape
+
+        :param attrs: dict of the attributes of the Shape element
+        :param children: List of the child elements in document order.
+                         :class:`Cell` and :class:`Section` classes, a list
+                         of nested :class:`SheetShape` classes and raw XML
+                         strings for everything else
+        """
+        self.attrs = attrs
+        self.children = children
+        self.cells = {}
+        self.shapes = []
+        for child in children:
+            if isinstance(child, Cell):
+                self.cells[child.name] = child
+            elif isinstance(child, list):
+                self.shapes = child
+
+    def get_cell(self, name):
+        """Return the cell with the given name
+
+        :param name: The name of the cell e.g. 'PinX'
+        :return: Instance of :class:`Cell` or None when not set on the shape
+        """
+        return self.cells.get(name)
 
-        return cls(id,
-                   type=type,
-                   line_style=line_style,
-                   fill_style=fill_style,
-                   text_style=text_style)
+    def set_cell(self, name, value, unit=None, formula=None):
+        """Set the value of a cell, adding the cell when needed
 
-    def to_xml(self):
-        root = ET.Element('Shape', {'ID': str(self.id),
-                                    'Type': self.type,
-                                    'LineStyle': str(self.line_style),
-                                    'FillStyle': str(self.fill_style),
-                                    'TextStyle': str(self.text_style)})
-        ET.SubElement(root, 'Cell', {'N': 'PinX', 'V': str(self.pin_x)})
-        ET.SubElement(root, 'Cell', {'N': 'PinY', 'V': str(self.pin_y)})
-        ET.SubElement(root, 'Cell', {'N': 'Width', 'V': str(self.width)})
-        ET.SubElement(root, 'Cell', {'N': 'Height', 'V': str(self.height)})
-        ET.SubElement(root, 'Cell', {'N': 'LocPinX', 'V': str(self.loc_pin_x), 'F': 'Width*0.5'})
-        ET.SubElement(root, 'Cell', {'N': 'LocPinY', 'V': str(self.loc_pin_y), 'F': 'Height*0.5'})
-        ET.SubElement(root, 'Cell', {'N': 'Angle', 'V': str(self.angle)})
-        if self.flip_x:
-            ET.SubElement(root, 'Cell', {'N': 'FlipX', 'V': '1'})
-        else:
-            ET.SubElement(root, 'Cell', {'N': 'FlipX', 'V': '0'})
-        if self.flip_y:
-            ET.SubElement(root, 'Cell', {'N': 'FlipY', 'V': '1'})
+        The formula of the cell is replaced, so Visio does not recalculate
+        the new value away.
+
+        :param name: The name of the cell e.g. 'PinX'
+        :param value: The new value
+        :param unit: Optional unit, the current unit is kept when omitted
+        :param formula: Optional formula of the cell
+        """
+        if isinstance(value, bool):
+            value = '1' if value else '0'
+
+        cell = self.cells.get(name)
+        if cell is None:
+            cell = Cell(name, str(value), unit, formula)
+            self.cells[cell.name] = cell
+            # Cells come before sections and the other child elements
+            for index, child in enumerate(self.children):
+                if not isinstance(child, Cell):
+                    self.children.insert(index, cell)
+                    break
+            else:
+                self.children.append(cell)
         else:
-            ET.SubElement(root, 'Cell', {'N': 'FlipY', 'V': '0'})
-        ET.SubElement(root, 'Cell', {'N': 'ResizeMode', 'V': str(self.resize_mode)})
+            cell.value = str(value)
+            cell.formula = formula
+            if unit is not None:
+                cell.unit = unit
+
+        if self.page is not None:
+            self.page.shape_changed(self)
+
+    def to_xml(self):
+        """Generate XML data for the shape
 
-        # TODO: I think the geometry data depicts what kind of shape it is
-        # I will default this now to a rectangle
+        :return: XML string
+        """
+        xml = ['<Shape', xml_attrs(self.attrs.items()), '>']
+        nested = False
+        for child in self.children:
+            if isinstance(child, str):
+                xml.append(child)
+            elif isinstance(child, list):
+                nested = True
+                if child:
+                    xml.append('<Shapes>')
+                    xml.extend(shape.to_xml() for shape in child)
+                    xml.append('</Shapes>')
+            else:
+                xml.append(child.to_xml())
+        if self.shapes and not nested:
+            xml.append('<Shapes>')
+            xml.extend(shape.to_xml() for shape in self.shapes)
+            xml.append('</Shapes>')
+        xml.append('</Shape>')
+        return ''.join(xml)
 
+    @classmethod
+    def from_xml(cls, xml_shape):
+        """Initialise the shape and everything within it from xml
 
-        geometry = ET.SubElement(root, 'Section', {'N': 'Geometry', 'IX': '0'})
-        ET.SubElement(geometry, 'Cell', {'N': 'NoFill', 'V': '0'})
-        ET.SubElement(geometry, 'Cell', {'N': 'NoLine', 'V': '0'})
-        ET.SubElement(geometry, 'Cell', {'N': 'NoShow', 'V': '0'})
-        ET.SubElement(geometry, 'Cell', {'N': 'NoSnap', 'V': '0'})
-        ET.SubElement(geometry, 'Cell', {'N': 'NoQuickDrag', 'V': '0'})
+        :param xml_shape: the shape from xml.etree.ElementTree
+        """
+        children = []
+        for child in xml_shape:
+            if child.tag == shapesheet.ns + 'Cell':
+                children.append(Cell.from_xml(child))
+            elif child.tag == shapesheet.ns + 'Section':
+                children.append(Section.from_xml(child))
+            elif child.tag == shapesheet.ns + 'Shapes':
+                children.append([cls.from_xml(item) for item in child])
+            else:
+                children.append(element_xml(child))
 
-        rel_move_to = ET.SubElement(geometry, 'Row', {'T': 'RelMoveTo', 'IX': '1'})
-        ET.SubElement(rel_move_to, 'Cell', {'N': 'X', 'V': '0'})
-        ET.SubElement(rel_move_to, 'Cell', {'N': 'Y', 'V': '0'})
+        return cls(dict(intern_attrs(xml_shape)), children)
 
-        rel_line_to1 = ET.SubElement(geometry, 'Row', {'T': 'RelMoveTo', 'IX': '2'})
-        ET.SubElement(rel_line_to1, 'Cell', {'N': 'X', 'V': '1'})
-        ET.SubElement(rel_line_to1, 'Cell', {'N': 'Y', 'V': '0'})
 
-        rel_line_to2 = ET.SubElement(geometry, 'Row', {'T': 'RelMoveTo', 'IX': '3'})
-        ET.SubElement(rel_line_to2, 'Cell', {'N': 'X', 'V': '1'})
-        ET.SubElement(rel_line_to2, 'Cell', {'N': 'Y', 'V': '1'})
+def sheet_attribute_property(attr_name):
+    """Create a property reading and writing an attribute of the Shape element"""
 
-        rel_line_to3 = ET.SubElement(geometry, 'Row', {'T': 'RelMoveTo', 'IX': '4'})
-        ET.SubElement(rel_line_to3, 'Cell', {'N': 'X', 'V': '0'})
-        ET.SubElement(rel_line_to3, 'Cell', {'N': 'Y', 'V': '1'})
+    def fget(self):
+        return self.attrs.get(attr_name)
 
-        rel_line_to4 = ET.SubElement(geometry, 'Row', {'T': 'RelMoveTo', 'IX': '5'})
-        ET.SubElement(rel_line_to4, 'Cell', {'N': 'X', 'V': '0'})
-        ET.SubElement(rel_line_to4, 'Cell', {'N': 'Y', 'V': '0'})
+    def fset(self, value):
+        self.attrs[attr_name] = str(value)
 
-        return ET.tostring(root, encoding='unicode')
+    return property(fget, fset)
+
+
+def cell_attribute_property(cell_name, decode):
+    """Create a property reading and writing the value of a cell"""
+
+    def fget(self):
+        cell = self.cells.get(cell_name)
+        if cell is None or cell.value is None or cell.value == '':
+            return None
+        return decode(cell.value)
+
+    def fset(self, value):
+        self.set_cell(cell_name, value)
+
+    return property(fget, fset)
+
+
+for _name, _attr_name in SheetShape.sheet_attributes.items():
+    setattr(SheetShape, _name, sheet_attribute_property(_attr_name))
+
+for _name, (_cell_name, _decode) in SheetShape.cell_attributes.items():
+    setattr(SheetShape, _name, cell_attribute_property(_cell_name, _decode))
+
+
+def connector_shape(id, begin_sheet, end_sheet, begin, end):
+    """Create a straight 1-D connector glued between two shapes
+
+    The endpoint cells carry the formulas Visio writes for glued
+    connectors, so the connector follows the shapes when they are moved.
+
+    :param id: The ID of the connector
+    :param begin_sheet: The ID of the shape the begin is glued to
+    :param end_sheet: The ID of the shape the end is glued to
+    :param begin: (x, y) of the begin on the page
+    :param end: (x, y) of the end on the page
+    :return: Instance of :class:`SheetShape`
+    """
+    (begin_x, begin_y), (end_x, end_y) = begin, end
+    width = math.hypot(end_x - begin_x, end_y - begin_y)
+    walk_glue = '_WALKGLUE(BegTrigger,EndTrigger,WalkPreference)'
+
+    cells = [('PinX', (begin_x + end_x) * 0.5, '(BeginX+EndX)/2'),
+             ('PinY', (begin_y + end_y) * 0.5, '(BeginY+EndY)/2'),
+             ('Width', width, 'SQRT((EndX-BeginX)^2+(EndY-BeginY)^2)'),
+             ('Height', 0.0, None),
+             ('LocPinX', width * 0.5, 'Width*0.5'),
+             ('LocPinY', 0.0, 'Height*0.5'),
+             ('Angle', math.atan2(end_y - begin_y, end_x - begin_x),
+              'ATAN2(EndY-BeginY,EndX-BeginX)'),
+             ('FlipX', 0, None),
+             ('FlipY', 0, None),
+             ('ResizeMode', 0, None),
+             ('BeginX', begin_x, walk_glue),
+             ('BeginY', begin_y, walk_glue),
+             ('EndX', end_x, walk_glue),
+             ('EndY', end_y, walk_glue),
+             ('BegTrigger', 2, '_XFTRIGGER(Sheet.{}!EventXFMod)'.format(begin_sheet)),
+             ('EndTrigger', 2, '_XFTRIGGER(Sheet.{}!EventXFMod)'.format(end_sheet)),
+             ('ObjType', 2, None)]
+
+    children = [Cell(name, str(value), formula=formula) for name, value, formula in cells]
+    children.append(get_geometry('line').section)
+    attrs = {'ID': str(id), 'Type': 'Shape', 'LineStyle': '3', 'FillStyle': '3', 'TextStyle': '3'}
+    return SheetShape(attrs, children)
 
 
 class Connect:
     """Contains a single connect object"""
 
-    def __init__(self):
-        pass
+    def __init__(self, **kwargs):
+        """Initialise the connect
+
+        The keyword arguments are the attributes of the Connect element,
+        e.g. FromSheet='1', ToSheet='2'
+        """
+        for key, value in kwargs.items():
+            setattr(self, key, value)
 
     def to_xml(self):
         """
@@ -389,8 +1209,10 @@ class Connect:
         End 12
         FromAngle 13
         FromPin 14
+
+        :return: XML string
         """
-        pass
+        return '<Connect{}/>'.format(xml_attrs(vars(self).items()))
 
     @staticmethod
     def from_xml(xml_connect):
@@ -404,6 +1226,3 @@ class Connect:
             setattr(cls, key, value)
 
         return cls
-
-    def to_xml(self):
-        pass
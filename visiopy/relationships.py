@@ -21,6 +21,8 @@ class Relationship:
     def __init__(self):
         """Initialise the relationship"""
         self.rels = {}
+        # Set when the rels have to be generated again on the next save
+        self.dirty = True
 
     def add(self, rel_id, target, type):
         """Add a relationship to the document
@@ -32,12 +34,21 @@ class Relationship:
         """
         if rel_id not in self.rels:
             self.rels[rel_id] = (target, type)
+            self.dirty = True
         else:
             raise ValueError('rel_id {} already exists'.format(rel_id))
 
     def rm(self, rel_id):
         """Remove relationship from pages relationships"""
         del self.rels[rel_id]
+        self.dirty = True
+
+    def copy(self):
+        """Return an independent copy of the relationships"""
+        rels = Relationship()
+        rels.rels = dict(self.rels)
+        rels.dirty = self.dirty
+        return rels
 
     def to_xml(self):
         """Generate XML from current relationships"""
@@ -53,7 +64,7 @@ class Relationship:
     def from_xml(xml_file):
         """Generate class from XML document
 
-        :param xml_file: The xml file to parse
+        :param xml_file: Filename or file object of the xml file to parse
         """
         cls = Relationship()
         tree = ET.parse(xml_file)
@@ -61,4 +72,6 @@ class Relationship:
 
         for page in root:
             cls.add(page.attrib['Id'], page.attrib['Target'], page.attrib['Type'])
+        # Unchanged until modified, the source part can be saved as it is
+        cls.dirty = False
         return cls
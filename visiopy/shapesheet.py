@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+
+"""
+visiopy.shapesheet
+
+This module holds a compact representation of parsed ShapeSheet data
+
+Cell values are kept as the raw strings found in the XML and are only
+decoded when asked for. Cell and attribute names are interned so the
+thousands of identical 'PinX' or 'Width' strings in a page share memory.
+
+:copyright: (c) 2016 by Mathijs Mortimer.
+"""
+
+import sys
+from xmlutils import (element_xml, escape_attr, qualified_name, xml_attrs)
+
+ns = '{http://schemas.microsoft.com/office/visio/2012/main}'
+
+
+class Cell:
+    """A single ShapeSheet cell"""
+
+    __slots__ = ('name', 'value', 'unit', 'formula', 'error', 'extra')
+
+    def __init__(self, name, value=None, unit=None, formula=None, error=None, extra=None):
+        """Initialise the cell
+
+        :param name: The name of the cell e.g. 'PinX'
+        :param value: The raw value string e.g. '1.5'
+        :param unit: The unit of the value e.g. 'MM'
+        :param formula: The formula of the cell e.g. 'Width*0.5'
+        :param error: The error of the formula e.g. '#REF!'
+        :param extra: Raw XML of child elements such as RefBy
+        """
+        self.name = sys.intern(name)
+        self.value = value
+        self.unit = unit
+        self.formula = formula
+        self.error = error
+        self.extra = extra
+
+    def as_float(self):
+        """Decode the value
+
+        :return: The value as float, or None when the cell has no value
+        """
+        if self.value is None or self.value == '':
+            return None
+        return float(self.value)
+
+    def to_xml(self):
+        """Generate XML data for the cell
+
+        :return: XML string
+        """
+        xml = ['<Cell N="', escape_attr(self.name), '"']
+        if self.value is not None:
+            xml.append(' V="{}"'.format(escape_attr(self.value)))
+        if self.unit is not None:
+            xml.append(' U="{}"'.format(escape_attr(self.unit)))
+        if self.formula is not None:
+            xml.append(' F="{}"'.format(escape_attr(self.formula)))
+        if self.error is not None:
+            xml.append(' E="{}"'.format(escape_attr(self.error)))
+        if self.extra:
+            xml.append('>{}</Cell>'.format(self.extra))
+        else:
+            xml.append('/>')
+        return ''.join(xml)
+
+    @classmethod
+    def from_xml(cls, elem):
+        """Initialise the cell from xml
+
+        :param elem: The Cell element from xml.etree.ElementTree
+        """
+        get = elem.attrib.get
+        extra = ''.join(element_xml(child) for child in elem) if len(elem) else None
+        return cls(elem.attrib['N'], get('V'), get('U'), get('F'), get('E'), extra)
+
+
+class Row:
+    """A row within a ShapeSheet section"""
+
+    __slots__ = ('attrs', 'cells')
+
+    def __init__(self, attrs, cells):
+        """Initialise the row
+
+        :param attrs: tuple of (name, value) attributes e.g. (('IX', '1'),)
+        :param cells: List of :class:`Cell` classes
+        """
+        self.attrs = attrs
+        self.cells = cells
+
+    def to_xml(self):
+        """Generate XML data for the row
+
+        :return: XML string
+        """
+        return '<Row{}>{}</Row>'.format(xml_attrs(self.attrs),
+                                        ''.join(cell.to_xml() for cell in self.cells))
+
+    @classmethod
+    def from_xml(cls, elem):
+        """Initialise the row from xml
+
+        :param elem: The Row element from xml.etree.ElementTree
+        """
+        return cls(intern_attrs(elem), [Cell.from_xml(child) for child in elem])
+
+
+class Section:
+    """A ShapeSheet section such as Geometry, Character or User"""
+
+    __slots__ = ('attrs', 'children')
+
+    def __init__(self, attrs, children):
+        """Initialise the section
+
+        :param attrs: tuple of (name, value) attributes e.g. (('N', 'User'),)
+        :param children: List of :class:`Cell` and :class:`Row` classes
+        """
+        self.attrs = attrs
+        self.children = children
+
+    @property
+    def name(self):
+        return dict(self.attrs).get('N')
+
+    def to_xml(self):
+        """Generate XML data for the section
+
+        :return: XML string
+        """
+        return '<Section{}>{}</Section>'.format(xml_attrs(self.attrs),
+                                                ''.join(child.to_xml() for child in self.children))
+
+    @classmethod
+    def from_xml(cls, elem):
+        """Initialise the section from xml
+
+        :param elem: The Section element from xml.etree.ElementTree
+        """
+        children = []
+        for child in elem:
+            if child.tag == ns + 'Row':
+                children.append(Row.from_xml(child))
+            else:
+                children.append(Cell.from_xml(child))
+        return cls(intern_attrs(elem), children)
+
+
+def intern_attrs(elem):
+    """Return the attributes of an element as tuple with interned names
+
+    :param elem: An xml.etree.ElementTree element
+    :return: tuple of (name, value) tuples
+    """
+    return tuple((sys.intern(qualified_name(name) or name), value)
+                 for name, value in elem.items())
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+
+"""
+visiopy.shapestore
+
+This module implements an array backed store for the shapes on a page
+
+:copyright: (c) 2016 by Mathijs Mortimer.
+"""
+
+import itertools
+from array import array
+from geometry import get_geometry
+from xmlutils import (SHAPE_XML, escape_attr, shape_xml)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class ShapeStore:
+    """Holds the shapes of a page in columns instead of :class:`Shape` objects
+
+    The numeric cells live in typed arrays, the type and style attributes in
+    plain lists. Indexing or iterating the store yields :class:`ShapeView`
+    objects that read and write through to the columns, so the store can
+    stand in for the list of shapes of a :class:`Page`.
+
+    Removing a shape shifts the rows after it, views taken before a removal
+    must not be used afterwards.
+    """
+
+    # The shape attributes in the order expected by shape_xml
+    attributes = ('id', 'type', 'line_style', 'fill_style', 'text_style',
+                  'pin_x', 'pin_y', 'width', 'height', 'loc_pin_x',
+                  'loc_pin_y', 'angle', 'flip_x', 'flip_y', 'resize_mode',
+                  'geometry')
+
+    # array typecodes of the numeric columns, the others are lists
+    typecodes = {'id': 'q',
+                 'pin_x': 'd',
+                 'pin_y': 'd',
+                 'width': 'd',
+                 'height': 'd',
+                 'loc_pin_x': 'd',
+                 'loc_pin_y': 'd',
+                 'angle': 'd',
+                 'flip_x': 'b',
+                 'flip_y': 'b',
+                 'resize_mode': 'l'}
+
+    def __init__(self, defaults, shapes=()):
+        """Initialise the store
+
+        :param defaults: Default values of the shape attributes,
+                         see :attr:`Shape.defaults`
+        :param shapes: :class:`Shape` objects to copy into the store
+        """
+        self.defaults = defaults
+        # The page notified when a shape changes through a view
+        self.owner = None
+        self.columns = {}
+        for name in self.attributes:
+            if name in self.typecodes:
+                self.columns[name] = array(self.typecodes[name])
+            else:
+                self.columns[name] = []
+
+        self.extend(shapes)
+
+    def __len__(self):
+        return len(self.columns['id'])
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield ShapeView(self, index)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [ShapeView(self, i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('shape index out of range')
+        return ShapeView(self, index)
+
+    def __delitem__(self, index):
+        for column in self.columns.values():
+            del column[index]
+
+    def append(self, shape):
+        """Copy a shape into the store
+
+        :param shape: :class:`Shape` or any object with the shape attributes
+        """
+        for name in self.attributes:
+            value = getattr(shape, name)
+            if name == 'id':
+                value = int(value)
+            self.columns[name].append(value)
+
+    def extend(self, shapes):
+        """Copy a sequence of shapes into the store"""
+        for shape in shapes:
+            self.append(shape)
+
+    def remove(self, shape):
+        """Remove a shape from the store
+
+        :param shape: :class:`ShapeView` of this store, or any shape with the
+                      same ID
+        """
+        if isinstance(shape, ShapeView) and shape.store is self:
+            del self[shape.index]
+        else:
+            del self[self.columns['id'].index(int(shape.id))]
+
+    def add_columns(self, ids, **columns):
+        """Append a batch of shapes given as columns
+
+        Missing columns are filled with the defaults, loc_pin_x and
+        loc_pin_y default to the center of each shape.
+
+        :param ids: Sequence of the ids of the new shapes
+        :param columns: Sequences of shape attributes keyed by name
+        """
+        count = len(ids)
+        self.columns['id'].extend(ids)
+
+        for name in self.attributes:
+            if name in ('id', 'loc_pin_x', 'loc_pin_y'):
+                continue
+            self.columns[name].extend(columns.get(name, itertools.repeat(self.defaults[name], count)))
+
+        for name, size in (('loc_pin_x', 'width'), ('loc_pin_y', 'height')):
+            if name in columns:
+                self.columns[name].extend(columns[name])
+            else:
+                self.columns[name].extend(value * 0.5 for value in self.columns[size][-count:])
+
+    def move(self, dx=0.0, dy=0.0):
+        """Move all shapes in the store
+
+        :param dx: Offset added to every PinX
+        :param dy: Offset added to every PinY
+        """
+        self._transform('pin_x', 1.0, dx)
+        self._transform('pin_y', 1.0, dy)
+
+    def scale(self, fx=1.0, fy=1.0):
+        """Scale all shapes in the store around the page origin
+
+        :param fx: Factor applied to the horizontal positions and sizes
+        :param fy: Factor applied to the vertical positions and sizes
+        """
+        for name in ('pin_x', 'width', 'loc_pin_x'):
+            self._transform(name, fx, 0.0)
+        for name in ('pin_y', 'height', 'loc_pin_y'):
+            self._transform(name, fy, 0.0)
+
+    def _transform(self, name, factor, offset):
+        """Apply value * factor + offset to a whole float column in place"""
+        column = self.columns[name]
+        if numpy is not None and len(column):
+            values = numpy.frombuffer(column, dtype=numpy.float64)
+            values *= factor
+            values += offset
+            del values
+        else:
+            column[:] = array('d', (value * factor + offset for value in column))
+
+    def iter_xml(self):
+        """Generate the XML data of every shape in the store
+
+        Writes the same XML as :func:`shape_xml`. The numeric columns
+        already hold floats and ints, only the few distinct style and
+        geometry values are escaped and looked up, once each.
+
+        :return: generator of XML strings
+        """
+        escaped = {}
+        geometries = {}
+
+        def escape(value):
+            try:
+                return escaped[value]
+            except KeyError:
+                result = escaped[value] = escape_attr(value)
+                return result
+
+        def geometry(name):
+            try:
+                return geometries[name]
+            except KeyError:
+                template = get_geometry(name)
+                result = geometries[name] = (template.cells, template.section)
+                return result
+
+        fmt = SHAPE_XML.format
+        columns = [self.columns[name] for name in self.attributes]
+        for (id, type, line_style, fill_style, text_style, pin_x, pin_y, width,
+             height, loc_pin_x, loc_pin_y, angle, flip_x, flip_y, resize_mode,
+             name) in zip(*columns):
+            cells, section = geometry(name)
+            yield fmt(id, escape(type), escape(line_style), escape(fill_style),
+                      escape(text_style), pin_x, pin_y, width, height, loc_pin_x,
+                      loc_pin_y, angle, '1' if flip_x else '0', '1' if flip_y else '0',
+                      resize_mode, cells, section)
+
+
+class ShapeView:
+    """A single row of a :class:`ShapeStore` with the :class:`Shape` API"""
+
+    __slots__ = ('store', 'index')
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+
+    def to_xml(self):
+        """Generate XML data for the shape
+
+        :return: XML string
+        """
+        row = [self.store.columns[name][self.index] for name in ShapeStore.attributes]
+        row[-1] = get_geometry(row[-1])
+        return shape_xml(*row)
+
+
+def column_property(name):
+    """Create a property reading and writing a column of the store"""
+
+    def fget(self):
+        return self.store.columns[name][self.index]
+
+    def fset(self, value):
+        self.store.columns[name][self.index] = value
+        if self.store.owner is not None:
+            self.store.owner.shape_changed(self)
+
+    def fget_flag(self):
+        return bool(self.store.columns[name][self.index])
+
+    def fset_id(self, value):
+        self.store.columns[name][self.index] = int(value)
+
+    if name in ('flip_x', 'flip_y'):
+        return property(fget_flag, fset)
+    if name == 'id':
+        return property(fget, fset_id)
+    return property(fget, fset)
+
+
+for _name in ShapeStore.attributes:
+    setattr(ShapeView, _name, column_property(_name))
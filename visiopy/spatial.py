@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+
+"""
+visiopy.spatial
+
+This module implements a spatial index for the shapes on a page
+
+:copyright: (c) 2016 by Mathijs Mortimer.
+"""
+
+import math
+
+
+class GridIndex:
+    """Uniform grid over the page answering region queries
+
+    Every item is registered in all grid cells its bounding box touches, a
+    query only looks at the items in the grid cells it touches itself, or
+    at the occupied cells when those are fewer.
+
+    An item spanning more than max_cells grid cells, e.g. a wall or a
+    background behind the small fixtures of a floor plan, is kept in a
+    separate list that every query checks, so a large item never fills the
+    grid. The cell size follows the median item size and is adapted when
+    that list keeps growing.
+    """
+
+    def __init__(self, cell_size=1.0, max_cells=64):
+        """Initialise the index
+
+        :param cell_size: Width and height of a grid cell in inches
+        :param max_cells: The number of grid cells an item may span before
+                          it is kept in the list of large items instead
+        """
+        self.cell_size = float(cell_size)
+        self.max_cells = max_cells
+        self.grid = {}
+        self.items = {}
+        # Keys of the items spanning more than max_cells grid cells
+        self.large = set()
+        # Rebuild with a new cell size once this many items are large
+        self.rebuild_at = max_cells
+
+    @classmethod
+    def from_items(cls, entries, max_cells=64):
+        """Build an index with a cell size fitting the items
+
+        :param entries: List of (key, item, bounds) tuples
+        :param max_cells: See :class:`GridIndex`
+        """
+        index = cls(cell_size_for(bounds for key, item, bounds in entries), max_cells)
+        for key, item, bounds in entries:
+            index.insert(key, item, bounds)
+        return index
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def _range(self, bounds):
+        """Return the grid cells (ix0, iy0, ix1, iy1) a box touches"""
+        x0, y0, x1, y1 = bounds
+        size = self.cell_size
+        return (int(math.floor(x0 / size)), int(math.floor(y0 / size)),
+                int(math.floor(x1 / size)), int(math.floor(y1 / size)))
+
+    @staticmethod
+    def _cells(cell_range):
+        ix0, iy0, ix1, iy1 = cell_range
+        for ix in range(ix0, ix1 + 1):
+            for iy in range(iy0, iy1 + 1):
+                yield ix, iy
+
+    @staticmethod
+    def _count(cell_range):
+        ix0, iy0, ix1, iy1 = cell_range
+        return (ix1 - ix0 + 1) * (iy1 - iy0 + 1)
+
+    def insert(self, key, item, bounds):
+        """Add an item to the index
+
+        :param key: Unique key of the item, e.g. the shape ID
+        :param item: The object returned by queries
+        :param bounds: tuple of (x0, y0, x1, y1)
+        """
+        if key in self.items:
+            self.remove(key)
+        self.items[key] = (item, bounds)
+
+        cell_range = self._range(bounds)
+        if self._count(cell_range) > self.max_cells:
+            self.large.add(key)
+            if len(self.large) >= self.rebuild_at:
+                self.rebuild()
+            return
+        for cell in self._cells(cell_range):
+            self.grid.setdefault(cell, set()).add(key)
+
+    def remove(self, key):
+        """Remove an item from the index, unknown keys are ignored
+
+        :param key: Unique key of the item
+        """
+        entry = self.items.pop(key, None)
+        if entry is None:
+            return
+        if key in self.large:
+            self.large.discard(key)
+            return
+        for cell in self._cells(self._range(entry[1])):
+            keys = self.grid[cell]
+            keys.discard(key)
+            if not keys:
+                del self.grid[cell]
+
+    def rebuild(self):
+        """Register all items again with a cell size fitting them"""
+        items = self.items
+        self.cell_size = cell_size_for(bounds for item, bounds in items.values())
+        self.grid = {}
+        self.items = {}
+        self.large = set()
+        # Rebuilding again only pays off once the large items doubled
+        self.rebuild_at = len(items) + 1
+        for key, (item, bounds) in items.items():
+            self.insert(key, item, bounds)
+        self.rebuild_at = max(self.max_cells, 2 * len(self.large))
+
+    def query(self, x0, y0, x1, y1, contained=False):
+        """Return the items whose bounds intersect a region
+
+        :param contained: Only return items lying completely within the region
+        :return: list of (item, bounds) tuples
+        """
+        cell_range = self._range((x0, y0, x1, y1))
+        if self._count(cell_range) > len(self.grid):
+            # A region larger than the occupied part of the grid
+            ix0, iy0, ix1, iy1 = cell_range
+            buckets = [keys for (ix, iy), keys in self.grid.items()
+                       if ix0 <= ix <= ix1 and iy0 <= iy <= iy1]
+        else:
+            buckets = [self.grid[cell] for cell in self._cells(cell_range) if cell in self.grid]
+        buckets.append(self.large)
+
+        found = set()
+        result = []
+        for keys in buckets:
+            for key in keys:
+                if key in found:
+                    continue
+                found.add(key)
+                item, (bx0, by0, bx1, by1) = self.items[key]
+                if contained:
+                    if bx0 >= x0 and by0 >= y0 and bx1 <= x1 and by1 <= y1:
+                        result.append((item, (bx0, by0, bx1, by1)))
+                elif bx0 <= x1 and by0 <= y1 and bx1 >= x0 and by1 >= y0:
+                    result.append((item, (bx0, by0, bx1, by1)))
+        return result
+
+
+def cell_size_for(bounds):
+    """Return a grid cell size about the size of the median box
+
+    The median keeps a few very large or very small boxes from skewing the
+    grid, those end up in the large items or share a cell instead.
+
+    :param bounds: iterable of (x0, y0, x1, y1) tuples
+    :return: The cell size in inches
+    """
+    extents = sorted(max(x1 - x0, y1 - y0) for x0, y0, x1, y1 in bounds)
+    extents = [extent for extent in extents if extent > 0]
+    if not extents:
+        return 1.0
+    return max(extents[len(extents) // 2], 0.01)
+
+
+def shape_frame(shape, master=None):
+    """Return the local box of a shape and how it is placed on the page
+
+    Cells the shape does not set itself are taken from its master shape.
+
+    :param master: The master shape the shape inherits its cells from
+    :return: tuple of (pin_x, pin_y, angle, (lx0, ly0, lx1, ly1)) where the
+             local box is relative to the pin, or None when the position or
+             size of the shape is neither set on the shape nor on its master
+    """
+    def value(name):
+        value = getattr(shape, name)
+        if value is None and master is not None:
+            value = getattr(master, name)
+        return value
+
+    pin_x = value('pin_x')
+    pin_y = value('pin_y')
+    width = value('width')
+    height = value('height')
+    if pin_x is None or pin_y is None or width is None or height is None:
+        return None
+
+    loc_pin_x = value('loc_pin_x')
+    loc_pin_y = value('loc_pin_y')
+    if loc_pin_x is None:
+        loc_pin_x = width * 0.5
+    if loc_pin_y is None:
+        loc_pin_y = height * 0.5
+
+    # Flipping mirrors the shape around its pin
+    if value('flip_x'):
+        lx0, lx1 = loc_pin_x - width, loc_pin_x
+    else:
+        lx0, lx1 = -loc_pin_x, width - loc_pin_x
+    if value('flip_y'):
+        ly0, ly1 = loc_pin_y - height, loc_pin_y
+    else:
+        ly0, ly1 = -loc_pin_y, height - loc_pin_y
+
+    return pin_x, pin_y, value('angle') or 0.0, (lx0, ly0, lx1, ly1)
+
+
+def shape_bounds(shape, master=None):
+    """Return the axis aligned bounding box of a shape on the page
+
+    Takes PinX/PinY, Width/Height, LocPinX/LocPinY, Angle and the flips into
+    account.
+
+    :param master: The master shape the shape inherits its cells from
+    :return: tuple of (x0, y0, x1, y1), or None when the position or size
+             of the shape is unknown, see :func:`shape_frame`
+    """
+    frame = shape_frame(shape, master)
+    if frame is None:
+        return None
+
+    pin_x, pin_y, angle, (lx0, ly0, lx1, ly1) = frame
+    if not angle:
+        return pin_x + lx0, pin_y + ly0, pin_x + lx1, pin_y + ly1
+
+    cos = math.cos(angle)
+    sin = math.sin(angle)
+    xs = []
+    ys = []
+    for x, y in ((lx0, ly0), (lx1, ly0), (lx1, ly1), (lx0, ly1)):
+        xs.append(pin_x + x * cos - y * sin)
+        ys.append(pin_y + x * sin + y * cos)
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def shape_contains(shape, x, y, master=None):
+    """Check whether a point on the page lies within the box of a shape
+
+    Unlike the bounding box this respects the rotation of the shape.
+
+    :param master: The master shape the shape inherits its cells from
+    """
+    frame = shape_frame(shape, master)
+    if frame is None:
+        return False
+
+    pin_x, pin_y, angle, (lx0, ly0, lx1, ly1) = frame
+    dx = x - pin_x
+    dy = y - pin_y
+    if angle:
+        cos = math.cos(angle)
+        sin = math.sin(angle)
+        dx, dy = dx * cos + dy * sin, -dx * sin + dy * cos
+    return lx0 <= dx <= lx1 and ly0 <= dy <= ly1
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+"""
+visiopy.stencils
+
+This module implements precompiled stencil libraries
+
+A stencil library holds the masters of one or more visio packages in a
+single file that is memory mapped on load. Every master is stored as its
+entry in masters.xml and its master?.xml part, still compressed, so it can
+be imported into a document without any XML parsing.
+
+Layout of a library file::
+
+    magic 'VSTL', version, index offset, index length
+    master data: Master element and compressed master?.xml part per master
+    index: JSON object keyed by master name
+
+:copyright: (c) 2016 by Mathijs Mortimer.
+"""
+
+import json
+import mmap
+import struct
+import xml.etree.ElementTree as ET
+import zipfile
+from package import (PackageReader, RawPart)
+from relationships import Relationship
+from xmlutils import (element_xml, xml_attrs)
+
+MAGIC = b'VSTL'
+VERSION = 1
+# magic, version, index offset, index length
+HEADER = struct.Struct('<4sHQQ')
+
+ns = '{http://schemas.microsoft.com/office/visio/2012/main}'
+r_ns = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+
+
+def compile_stencils(filenames, library_file):
+    """Compile the masters of visio packages into a stencil library
+
+    Masters are stored under their universal name (NameU), a later package
+    replaces a master of the same name from an earlier one. Masters with
+    relationships of their own, e.g. to embedded images, are skipped.
+
+    :param filenames: Filenames or file objects of *.vsdx or *.vssx files
+    :param library_file: Filename of the stencil library to write
+    :return: List of the names of the compiled masters
+    """
+    masters = {}
+    for filename in filenames:
+        with PackageReader(filename) as package:
+            masters.update(read_masters(package))
+
+    with open(library_file, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, 0))
+        index = {}
+        for name, (element, raw_part) in masters.items():
+            element = element.encode('utf-8')
+            element_offset = f.tell()
+            f.write(element)
+            part_offset = f.tell()
+            f.write(raw_part.compressed)
+            index[name] = {'element': [element_offset, len(element)],
+                           'part': [part_offset, len(raw_part.compressed)],
+                           'compress_type': raw_part.info.compress_type,
+                           'crc': raw_part.info.CRC,
+                           'file_size': raw_part.info.file_size}
+
+        index_data = json.dumps(index, sort_keys=True).encode('utf-8')
+        index_offset = f.tell()
+        f.write(index_data)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, index_offset, len(index_data)))
+
+    return sorted(masters)
+
+
+def read_masters(package):
+    """Read the masters of an opened package
+
+    :param package: Instance of :class:`PackageReader`
+    :return: dict of name to tuple of (Master element XML, :class:`RawPart`)
+             where the element lacks its tag name, ID attribute, Rel child
+             and end tag
+    """
+    masters_part = 'visio/masters/masters.xml'
+    if masters_part not in package:
+        return {}
+
+    with package.open('visio/masters/_rels/masters.xml.rels') as f:
+        rels = Relationship.from_xml(f).rels
+    with package.open(masters_part) as f:
+        root = ET.parse(f).getroot()
+
+    masters = {}
+    for elem in root.iter(ns + 'Master'):
+        rel = elem.find(ns + 'Rel')
+        target = rels[rel.get(r_ns + 'id')][0]
+        part_name = 'visio/masters/' + target.split('/')[-1]
+        if 'visio/masters/_rels/{}.rels'.format(part_name.split('/')[-1]) in package:
+            continue
+
+        attrs = [(name, value) for name, value in elem.items() if name != 'ID']
+        children = ''.join(element_xml(child) for child in elem if child is not rel)
+        # Kept without the tag name and end tag, see StencilLibrary.element
+        element = '{}>{}'.format(xml_attrs(attrs), children)
+        name = elem.get('NameU') or elem.get('Name')
+        masters[name] = (element, package.raw_part(part_name))
+
+    return masters
+
+
+class StencilLibrary:
+    """A compiled stencil library, memory mapped for cheap loading
+
+    Only the small JSON index is decoded when the library is opened, the
+    masters are sliced from the mapping when they are imported.
+    """
+
+    def __init__(self, filename):
+        """Open a stencil library
+
+        :param filename: Filename of a library written by
+                         :func:`compile_stencils`
+        """
+        self.file = open(filename, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, index_offset, index_length = HEADER.unpack_from(self.data)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError('{} is not a stencil library'.format(filename))
+        if version != VERSION:
+            self.close()
+            raise ValueError('Unsupported stencil library version {}'.format(version))
+        self.index = json.loads(self.data[index_offset:index_offset + index_length].decode('utf-8'))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def names(self):
+        """Return the names of the masters in the library"""
+        return sorted(self.index)
+
+    def _entry(self, name):
+        try:
+            return self.index[name]
+        except KeyError:
+            raise KeyError('Master {} not found in stencil library'.format(name))
+
+    def element(self, name, id, rel_id):
+        """Return the masters.xml entry of a master
+
+        :param name: The name of the master
+        :param id: The master ID within the document
+        :param rel_id: The relationship ID of the master?.xml part within
+                       masters.xml.rels
+        :return: XML string
+        """
+        offset, length = self._entry(name)['element']
+        element = self.data[offset:offset + length].decode('utf-8')
+        return '<Master ID="{}"{}<Rel r:id="{}"/></Master>'.format(id, element, rel_id)
+
+    def raw_part(self, name, part_name):
+        """Return the master?.xml part of a master, still compressed
+
+        :param name: The name of the master
+        :param part_name: Name of the part within the document
+        :return: Instance of :class:`RawPart`
+        """
+        entry = self._entry(name)
+        offset, length = entry['part']
+        info = zipfile.ZipInfo(part_name)
+        info.compress_type = entry['compress_type']
+        info.CRC = entry['crc']
+        info.file_size = entry['file_size']
+        return RawPart(info, self.data[offset:offset + length])
+
+    def close(self):
+        """Unmap and close the library file"""
+        self.data.close()
+        self.file.close()
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+"""
+visiopy.template
+
+This module implements stamping out documents from a template
+
+:copyright: (c) 2016 by Mathijs Mortimer.
+"""
+
+import io
+from package import (PackageReader, PackageWriter)
+from pages import (Page, PageCollection)
+from visio import Document
+
+
+class DocumentTemplate:
+    """A document serialised once and handed out as cheap copies
+
+    The template is written to an in-memory package once. Every document
+    handed out by :meth:`new_document` shares the compressed parts and
+    pages of that package and only copies the small content types and
+    relationship tables. A page is parsed only when its shapes are first
+    touched, pages and parts that are left alone are copied into the saved
+    file still compressed.
+    """
+
+    def __init__(self, document):
+        """Initialise the template
+
+        Later changes to the document are not picked up by the template.
+
+        :param document: Instance of :class:`Document`
+        """
+        data = io.BytesIO()
+        with PackageWriter(data) as package:
+            document.write_parts(package)
+
+        with PackageReader(data) as package:
+            self.document = Document.from_package(package)
+
+        # Pages as plain tuples, so the template pages are never loaded
+        self.pages = [(page.filename, page.id, page.rel_id, page.name, page.source,
+                       page.attrs, page.page_sheet)
+                      for page in self.document.page_collection.pages]
+
+    @classmethod
+    def from_file(cls, file):
+        """Load a template from a visio diagram
+
+        :param file: Filename or readable binary file object
+        """
+        return cls(Document.from_file(file))
+
+    def new_document(self):
+        """Return a new document with the contents of the template
+
+        :return: Instance of :class:`Document`
+        """
+        template = self.document
+        content_types = template.content_types.copy()
+        pages = [Page(filename, id, rel_id, name=name, source=source,
+                      attrs=attrs, page_sheet=page_sheet)
+                 for filename, id, rel_id, name, source, attrs, page_sheet in self.pages]
+        page_collection = PageCollection(content_types,
+                                         rels=template.page_collection.rels.copy(),
+                                         pages=pages)
+        page_collection.dirty = False
+
+        return Document(content_types=content_types,
+                        page_collection=page_collection,
+                        package_rels=template.package_rels.copy(),
+                        document_rels=template.document_rels.copy(),
+                        parts=dict(template.parts),
+                        saved_parts=dict(template.saved_parts))
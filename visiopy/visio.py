@@ -1,14 +1,43 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import zipfile
-import shutil
+import hashlib
+import io
 import os
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from xml.sax.saxutils import unescape
+from package import (PackageReader, PackageWriter, PartCompressor,
+                     compress_part)
+from ids import IdAllocator
 from relationships import Relationship
 from content_types import ContentTypes
 from pages import PageCollection
 from hacks import (WindowsProperties, DocumentProperties)
 from docprops import DocProps
+from masters import (DocumentMasters, master_cache)
+import aio
+
+MASTER_PART = re.compile(r'^visio/masters/master\d+\.xml$')
+MASTER_TAG = re.compile(r'<Master\s([^>]*)>')
+XML_ATTR = re.compile(r'([\w:]+)=([\'"])(.*?)\2')
+
+MASTERS_XML = ('<?xml version="1.0" encoding="utf-8" ?>'
+               '<Masters xmlns="http://schemas.microsoft.com/office/visio/2012/main" '
+               'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships" '
+               'xml:space="preserve"></Masters>')
+
+THUMBNAIL = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'thumbnail.emf')
+
+# Compressed static parts shared by all documents of the process, keyed by
+# part name, compression level and the digest of the contents. Only the
+# STATIC_PARTS_MAX most recently used parts are kept
+static_parts = OrderedDict()
+static_parts_lock = threading.Lock()
+STATIC_PARTS_MAX = 32
 
 
 class Document:
@@ -47,6 +76,13 @@ class Document:
     |- [Content_Types].xml
     """
 
+    # Parts generated from the document model once it is modified
+    modelled_parts = ('[Content_Types].xml',
+                      '_rels/.rels',
+                      'visio/_rels/document.xml.rels',
+                      'visio/pages/pages.xml',
+                      'visio/pages/_rels/pages.xml.rels')
+
     def __init__(self, **kwargs):
 
         # Content_Types
@@ -72,6 +108,18 @@ class Document:
             self.document_rels.add("rId2", "windows.xml", "http://schemas.microsoft.com/visio/2010/relationships/windows")
             self.document_rels.add("rId1", "pages/pages.xml", "http://schemas.microsoft.com/visio/2010/relationships/pages")
 
+        # Parts carried over untouched from a loaded package, a dict of
+        # part name to :class:`RawPart`
+        self.parts = kwargs.get('parts', {})
+
+        # Masters by ID, the shapes on the pages inherit their cells from
+        self.masters = DocumentMasters(self.parts)
+        self.page_collection.masters = self.masters
+
+        # Compressed parts generated by the last save, or read from the
+        # source package, see write_generated
+        self.saved_parts = kwargs.get('saved_parts', {})
+
         # Document properties
         self.doc_props = DocProps()
         self.windows_properties = WindowsProperties()
@@ -92,137 +140,493 @@ class Document:
         # custom.xml data
         self.is_metric = True  # Using the metric system
 
-    def to_file(self, filename, tmp_folder='./tmp'):
+    def to_file(self, filename, workers=None, compression=None, static_cache=True):
         """Writes visio diagram to file
 
-        :param filename: The filename to write to
+        Every part is written straight into the zip archive, nothing is
+        staged on disk first.
+
+        :param filename: The filename to write to, '.vsdx' is appended
+                         when missing
+        :param workers: Serialise and compress the pages in a pool of this
+                        many processes
+        :param compression: How the parts are compressed. None for the
+                            default deflate level, parts copied from a
+                            source package keep their compression. One of
+                            'stored', 'fast', 'default' or 'max' for all
+                            parts, copied ones included. Or a
+                            :class:`CompressionPolicy` for per part settings
+        :param static_cache: Reuse the compressed static parts, such as
+                             the thumbnail and document.xml, of earlier saves
+                             by any document of this process
         """
-        if filename.endswith('.vsdx'):
-            filename.strip('.vsdx')
-
-        # Create the directory structure
-        if not os.path.exists(tmp_folder):
-            os.makedirs(tmp_folder)
-            os.makedirs(tmp_folder + '/_rels')
-            os.makedirs(tmp_folder + '/docProps')
-            os.makedirs(tmp_folder + '/visio')
-            os.makedirs(tmp_folder + '/visio/_rels')
-            os.makedirs(tmp_folder + '/visio/pages')
-            os.makedirs(tmp_folder + '/visio/pages/_rels')
-            # TODO the masters folder seems to be generated when you
-            # create a connection. Lets tackle this when i've got
-            # the basics worked out.
-            # os.makedirs(tmp_folder + '/visio/masters')
-            # os.makedirs(tmp_folder + '/visio/masters/_rels')
-            # TODO the theme folder lets you put themes on your diagram?
-            # not present when theres no theme customisation
-            # os.makedirs(tmp_folder + '/visio/theme')
-        else:
-            raise IOError('Error writing to file {}. '
-                          'tmp folder {} already exists'
-                          .format(filename, tmp_folder))
+        if not filename.endswith('.vsdx'):
+            filename += '.vsdx'
+
+        with open(filename, 'wb') as f:
+            self.to_stream(f, workers=workers, compression=compression,
+                           static_cache=static_cache)
 
+    def to_stream(self, stream, workers=None, compression=None, static_cache=True):
+        """Write the visio diagram into a binary stream
+
+        Every part goes out as soon as it is generated, the first bytes are
+        written before the pages are serialised. The stream does not need
+        to be seekable, e.g. a socket or an HTTP response body.
+
+        :param stream: Writable binary file object, it is not closed
+        :param workers: See :meth:`to_file`
+        :param compression: See :meth:`to_file`
+        :param static_cache: See :meth:`to_file`
+        """
+        with PackageWriter(stream, compression) as package:
+            self.write_parts(package, workers=workers, static_cache=static_cache)
+
+    def to_bytes(self, workers=None, compression=None, static_cache=True):
+        """Return the visio diagram as the bytes of a *.vsdx file
+
+        :param workers: See :meth:`to_file`
+        :param compression: See :meth:`to_file`
+        :param static_cache: See :meth:`to_file`
+        :return: The *.vsdx file contents
+        """
+        stream = io.BytesIO()
+        self.to_stream(stream, workers=workers, compression=compression,
+                       static_cache=static_cache)
+        return stream.getvalue()
+
+    def write_parts(self, package, workers=None, static_cache=True):
+        """Write all parts of the document into a package
+
+        Parts generated from the document model are kept compressed and
+        written again as they are on later saves, until the content types,
+        relationships or page they come from are flagged dirty. Saving
+        after a small change only serialises what changed.
+
+        :param package: Instance of :class:`PackageWriter`
+        :param workers: Serialise and compress the pages in a pool of this
+                        many processes
+        :param static_cache: Reuse the compressed static parts of earlier
+                             saves by any document of this process
+        """
         xml_decl = '<?xml version="1.0" encoding="utf-8" ?>'
         xml_decl_standalone = '<?xml version="1.0" encoding="utf-8" standalone="yes" ?>'
 
         # Create [content_Types].xml
-        with open(tmp_folder + '/[Content_Types].xml', 'w') as f:
-            f.write(xml_decl_standalone)
-            f.write(self.content_types.to_xml())
+        self.write_generated(package, '[Content_Types].xml', self.content_types,
+                             lambda: xml_decl_standalone + self.content_types.to_xml())
+
+        # Create _rels files
+        self.write_generated(package, '_rels/.rels', self.package_rels,
+                             lambda: xml_decl_standalone + self.package_rels.to_xml())
+        self.write_generated(package, 'visio/_rels/document.xml.rels', self.document_rels,
+                             lambda: xml_decl_standalone + self.document_rels.to_xml())
+
+        # Create docProps files, unless the source package had them
+        if 'docProps/app.xml' not in self.parts:
+            self.write_generated(package, 'docProps/app.xml', self.doc_props,
+                                 lambda: xml_decl_standalone + self.doc_props.to_app_xml(),
+                                 static=static_cache)
+        if 'docProps/core.xml' not in self.parts:
+            self.write_generated(package, 'docProps/core.xml', self.doc_props,
+                                 lambda: xml_decl_standalone + self.doc_props.to_core_xml(),
+                                 static=static_cache)
+        if 'docProps/custom.xml' not in self.parts:
+            self.write_generated(package, 'docProps/custom.xml', self.doc_props,
+                                 lambda: xml_decl_standalone + self.doc_props.to_custom_xml(),
+                                 static=static_cache)
+        if 'docProps/thumbnail.emf' not in self.parts:
+            self.write_generated(package, 'docProps/thumbnail.emf', None, read_thumbnail,
+                                 static=static_cache)
 
-        # Create docProps files
-        app_xml, core_xml, custom_xml = self.doc_props.to_xml()
+        # Write pages.xml and pages.xml.rels
+        page_collection = self.page_collection
+        self.write_generated(package, 'visio/pages/_rels/pages.xml.rels', page_collection.rels,
+                             lambda: xml_decl_standalone + page_collection.rels.to_xml())
+        self.write_generated(package, 'visio/pages/pages.xml', page_collection,
+                             lambda: xml_decl + page_collection.to_xml()[0])
 
-        with open('{}/docProps/app.xml'.format(tmp_folder), 'w') as f:
-            f.write(xml_decl_standalone)
-            f.write(app_xml)
+        # Write page?.xml and page?.xml.rels
+        # TODO, page?.xml.rels not generated yet
+        # Pages that are not dirty are copied still compressed, the others
+        # are optionally serialised in a process pool up front
+        pages = page_collection.pages
+        if workers:
+            raw_pages = self.compress_pages(workers, package.policy)
+        else:
+            raw_pages = [None] * len(pages)
+
+        for page, raw_page in zip(pages, raw_pages):
+            part_name = 'visio/pages/{}'.format(page.filename)
+            if raw_page is None:
+                if page.dirty or page.saved is None:
+                    raw_page = compress_page(page, package.policy.level_for(part_name))
+                elif not package.policy.accepts(part_name, page.saved):
+                    raw_page = package.compress(part_name, page.saved.read())
+                else:
+                    raw_page = page.saved
+            page.saved = raw_page
+            page.dirty = False
+            package.write_raw(part_name, raw_page)
+
+        # Create visio document and window properties, unless the source
+        # package had them
+        if 'visio/windows.xml' not in self.parts:
+            self.write_generated(package, 'visio/windows.xml', self.windows_properties,
+                                 self.windows_properties.to_xml, static=static_cache)
+        if 'visio/document.xml' not in self.parts:
+            self.write_generated(package, 'visio/document.xml', self.document_properties,
+                                 self.document_properties.to_xml, static=static_cache)
+
+        # Copy everything we don't model (masters, theme, media, page rels)
+        # from the source package without recompressing it. Rels of pages
+        # that were removed are dropped.
+        page_rels = set('visio/pages/_rels/{}.rels'.format(page.filename)
+                        for page in pages)
+        for part_name, raw_part in self.parts.items():
+            if part_name.startswith('visio/pages/_rels/') and part_name not in page_rels:
+                continue
+            package.write_copy(part_name, raw_part)
+
+        for model in (self.content_types, self.package_rels, self.document_rels,
+                      page_collection, page_collection.rels):
+            model.dirty = False
+
+    def write_generated(self, package, part_name, model, generate, static=False):
+        """Write a part generated from the document model
+
+        The part is only generated and compressed again when the model is
+        flagged dirty or the part was compressed differently, otherwise the
+        compressed part of the previous save is written as it is.
+
+        :param package: Instance of :class:`PackageWriter`
+        :param part_name: Name of the part. e.g. '[Content_Types].xml'
+        :param model: The object the part is generated from. Parts of
+                      objects without a dirty flag are generated once
+        :param generate: Callable returning the part contents as str or bytes
+        :param static: Look the compressed part up in :data:`static_parts`
+                       by the digest of its contents before compressing it
+        """
+        raw_part = self.saved_parts.get(part_name)
+        if raw_part is None or getattr(model, 'dirty', False) or \
+                not package.policy.accepts(part_name, raw_part):
+            data = generate()
+            if static:
+                raw_part = static_part(package, part_name, data)
+            else:
+                raw_part = package.compress(part_name, data)
+            self.saved_parts[part_name] = raw_part
+        package.write_raw(part_name, raw_part)
+
+    def compress_pages(self, workers, policy):
+        """Serialise and compress the dirty pages in a process pool
+
+        :param workers: The number of worker processes
+        :param policy: Instance of :class:`CompressionPolicy`
+        :return: List with a :class:`RawPart` for every dirty page and None
+                 for pages that are copied as they are, in page order
+        """
+        pages = self.page_collection.pages
+        raw_pages = [None] * len(pages)
+        todo = [index for index, page in enumerate(pages)
+                if page.dirty or page.saved is None]
 
-        with open('{}/docProps/core.xml'.format(tmp_folder), 'w') as f:
-            f.write(xml_decl_standalone)
-            f.write(core_xml)
+        if todo:
+            levels = [policy.level_for('visio/pages/{}'.format(pages[index].filename))
+                      for index in todo]
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = executor.map(compress_page, [pages[index] for index in todo], levels)
+                for index, raw_page in zip(todo, results):
+                    raw_pages[index] = raw_page
 
-        with open('{}/docProps/custom.xml'.format(tmp_folder), 'w') as f:
-            f.write(xml_decl_standalone)
-            f.write(custom_xml)
+        return raw_pages
 
-        shutil.copy('thumbnail.emf', '{}/docProps/'.format(tmp_folder))
+    @classmethod
+    def from_file(cls, file):
+        """Load a visio diagram
 
-        # Write pages.xml and pages.xml.rels
-        pages_xml, pages_xml_rels = self.page_collection.to_xml()
+        The parts are parsed straight from the zip archive, nothing is
+        extracted to disk.
 
-        with open('{}/visio/pages/_rels/pages.xml.rels'.format(tmp_folder), 'w') as f:
-            f.write(xml_decl_standalone)
-            f.write(pages_xml_rels)
+        :param file: Filename or readable binary file object
+        """
+        with PackageReader(file) as package:
+            return cls.from_package(package)
 
-        with open('{}/visio/pages/pages.xml'.format(tmp_folder), 'w') as f:
-            f.write(xml_decl)
-            f.write(pages_xml)
+    @classmethod
+    def from_bytes(cls, data):
+        """Load a visio diagram from the raw bytes of a *.vsdx file
 
-        # Write page?.xml and page?.xml.rels
-        # TODO, page?.xml.rels not generated yet
-        for page in self.page_collection.pages:
-            with open('{}/visio/pages/{}'.format(tmp_folder, page.filename), 'w') as f:
-                f.write(xml_decl)
-                f.write(page.to_xml())
+        :param data: The *.vsdx file contents
+        """
+        return cls.from_file(io.BytesIO(data))
 
-        # Create _rels files
-        xml_declaration = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    @classmethod
+    async def from_bytes_async(cls, data, lazy=False):
+        """Load a visio diagram from raw bytes without blocking the event loop
 
-        with open('{}/_rels/.rels'.format(tmp_folder), 'w') as f:
-            f.write(xml_decl_standalone)
-            f.write(self.package_rels.to_xml())
+        Decompressing and parsing runs in the executor of :mod:`aio`,
+        within its concurrency limit.
 
-        with open('{}/visio/_rels/document.xml.rels'.format(tmp_folder), 'w') as f:
-            f.write(xml_decl_standalone)
-            f.write(self.document_rels.to_xml())
+        :param data: The *.vsdx file contents
+        :param lazy: Leave the pages unparsed. Parsing then happens on first
+                     access, in the thread touching the page
+        :return: Instance of :class:`Document`
+        """
+        return await aio.run_blocking(load_document, data, lazy)
+
+    async def to_bytes_async(self, workers=None, compression=None):
+        """Serialise the diagram to bytes without blocking the event loop
 
-        # Create visio document and window properties
-        with open(tmp_folder + '/visio/windows.xml', 'w') as f:
-            f.write(self.windows_properties.to_xml())
+        Don't change the document while this runs. In a process pool
+        executor every call saves the whole document, see :mod:`aio`.
 
-        with open(tmp_folder + '/visio/document.xml', 'w') as f:
-            f.write(self.document_properties.to_xml())
+        :param workers: Serialise and compress the pages in a pool of this
+                        many processes
+        :param compression: See :meth:`to_file`
+        :return: The *.vsdx file contents
+        """
+        return await aio.run_blocking(self.to_bytes, workers=workers, compression=compression)
 
-        # Zip the tmp_folder contents and rename file to vsdx
-        shutil.make_archive(filename, 'zip', tmp_folder)
-        shutil.move(filename + '.zip', filename + '.vsdx')
+    async def save_async(self, filename, workers=None, compression=None):
+        """Write the diagram to file without blocking the event loop
 
-        # Remove the temporary folder
-        shutil.rmtree(tmp_folder)
+        Serialising, compressing and writing run in the executor of
+        :mod:`aio`, within its concurrency limit. Don't change the document
+        while this runs. In a process pool executor every call saves the
+        whole document, see :mod:`aio`.
+
+        :param filename: The filename to write to, '.vsdx' is appended
+                         when missing
+        :param workers: Serialise and compress the pages in a pool of this
+                        many processes
+        :param compression: See :meth:`to_file`
+        """
+        await aio.run_blocking(self.to_file, filename, workers=workers, compression=compression)
 
     @classmethod
-    def from_file(cls, filename):
-        # unzip vsdx file to temp. folder
-        directory = './{}'.format(filename.rsplit('.', 1)[0])
-        with zipfile.ZipFile(filename, "r") as zip_ref:
-            zip_ref.extractall(directory)
+    def from_package(cls, package):
+        """Load a visio diagram from an opened package
 
+        :param package: Instance of :class:`PackageReader`
+        """
         # Read [Content_Types].xml
-        content_types = ContentTypes.from_xml(directory + '/[Content_Types].xml')
+        with package.open('[Content_Types].xml') as f:
+            content_types = ContentTypes.from_xml(f)
 
         # Read relationships
-        package_rels = Relationship.from_xml('{}/_rels/.rels'.format(directory))
-        document_rels = Relationship.from_xml('{}/visio/_rels/document.xml.rels'.format(directory))
+        with package.open('_rels/.rels') as f:
+            package_rels = Relationship.from_xml(f)
+        with package.open('visio/_rels/document.xml.rels') as f:
+            document_rels = Relationship.from_xml(f)
 
         # Read pages and relationships
-        page_collection = PageCollection.from_xml(directory, content_types)
+        page_collection = PageCollection.from_xml(package, content_types)
+
+        # The modelled parts are saved as they are stored in the package
+        # until their model is modified
+        saved_parts = dict((part_name, package.raw_part(part_name))
+                           for part_name in cls.modelled_parts if part_name in package)
+
+        # Keep all other parts as they are stored in the package
+        modelled_parts = set(cls.modelled_parts)
+        modelled_parts.update('visio/pages/{}'.format(page.filename)
+                              for page in page_collection.pages)
+        parts = {}
+        for part_name in package.names():
+            if part_name not in modelled_parts and not part_name.endswith('/'):
+                parts[part_name] = package.raw_part(part_name)
 
-        # Remove extracted folder again
-        shutil.rmtree(directory)
         return cls(page_collection=page_collection,
                    package_rels=package_rels,
                    document_rels=document_rels,
-                   content_types=content_types)
+                   content_types=content_types,
+                   parts=parts,
+                   saved_parts=saved_parts)
+
+    def add_page(self, name, columnar=False):
+        """Add a page to the document
+
+        :param name: The name of the page
+        :param columnar: Keep the shapes of the page in a :class:`ShapeStore`
+        :return: rel_id e.g: 'rId1'
+        """
+        return self.page_collection.add_page(name, columnar=columnar)
 
-    def add_page(self, name):
-        """Add a page to the document"""
-        return self.page_collection.add_page(name)
+    def get_page(self, rel_id):
+        """Return the page with the given rel_id"""
+        return self.page_collection.get_page(rel_id)
+
+    def get_page_by_name(self, name):
+        """Return the page with the given name"""
+        return self.page_collection.get_page_by_name(name)
 
     def add_shape(self, page_rel_id, **kwargs):
         return self.page_collection.add_shape(page_rel_id, **kwargs)
 
+    def add_shapes(self, page_rel_id, **columns):
+        """Add a batch of shapes to a page
+
+        See :meth:`Page.add_shapes` for the columns.
+
+        :return: range of the ids of the new shapes
+        """
+        return self.page_collection.add_shapes(page_rel_id, **columns)
+
+    def master_parts(self):
+        """Return the names of the master?.xml parts of the document"""
+        return sorted(part_name for part_name in self.parts
+                      if MASTER_PART.match(part_name))
+
+    def get_master(self, part_name, cache=master_cache):
+        """Return a parsed master of the document
+
+        Masters are looked up by the hash of their contents in a cache
+        shared by all documents, identical masters are parsed only once.
+        The returned :class:`Master` is shared, don't modify it.
+
+        :param part_name: Name of the part. e.g. 'visio/masters/master1.xml'
+        :param cache: Instance of :class:`MasterCache`
+        :return: Instance of :class:`Master`
+        """
+        try:
+            raw_part = self.parts[part_name]
+        except KeyError:
+            raise KeyError('Master {} not found'.format(part_name))
+        return cache.get(raw_part.read())
+
+    def import_master(self, library, name):
+        """Import a single master from a stencil library
+
+        See :meth:`import_masters`.
+
+        :return: The master ID within the document
+        """
+        return self.import_masters(library, [name])[name]
+
+    def import_masters(self, library, names):
+        """Import masters from a stencil library
+
+        The master?.xml parts are copied still compressed and their
+        masters.xml entries are spliced in as text, nothing is parsed.
+        Masters the document already has under the same name are not
+        imported again.
+
+        :param library: Instance of :class:`StencilLibrary`
+        :param names: The names of the masters to import
+        :return: dict of name to the master ID within the document
+        """
+        xml_decl_standalone = '<?xml version="1.0" encoding="utf-8" standalone="yes" ?>'
+        masters_part = 'visio/masters/masters.xml'
+        rels_part = 'visio/masters/_rels/masters.xml.rels'
+
+        if masters_part in self.parts:
+            masters_xml = self.parts[masters_part].read().decode('utf-8')
+            masters_rels = Relationship.from_xml(io.BytesIO(self.parts[rels_part].read()))
+        else:
+            masters_xml = MASTERS_XML
+            masters_rels = Relationship()
+
+        # Masters already in the document by name
+        master_ids = {}
+        for attrs in MASTER_TAG.findall(masters_xml):
+            attrs = dict((key, unescape(value)) for key, quote, value in XML_ATTR.findall(attrs))
+            master_ids[attrs.get('NameU', attrs.get('Name'))] = int(attrs['ID'])
+
+        ids = IdAllocator(used=master_ids.values())
+        rel_ids = IdAllocator(used=masters_rels.rels)
+        filenames = IdAllocator(used=self.master_parts())
+
+        elements = []
+        for name in names:
+            if name in master_ids:
+                continue
+
+            id = ids.allocate()
+            rel_id = 'rId{}'.format(rel_ids.allocate())
+            filename = 'master{}.xml'.format(filenames.allocate())
+            part_name = 'visio/masters/' + filename
+
+            elements.append(library.element(name, id, rel_id))
+            self.parts[part_name] = library.raw_part(name, part_name)
+            masters_rels.add(rel_id, filename, 'http://schemas.microsoft.com/visio/2010/relationships/master')
+            self.content_types.add('/' + part_name, 'application/vnd.ms-visio.master+xml')
+            master_ids[name] = id
+
+        if elements:
+            if masters_part not in self.parts:
+                rel_id = 'rId{}'.format(IdAllocator(used=self.document_rels.rels).allocate())
+                self.document_rels.add(rel_id, 'masters/masters.xml',
+                                       'http://schemas.microsoft.com/visio/2010/relationships/masters')
+                self.content_types.add('/' + masters_part, 'application/vnd.ms-visio.masters+xml')
+
+            end = masters_xml.rindex('</Masters>')
+            masters_xml = masters_xml[:end] + ''.join(elements) + masters_xml[end:]
+            self.parts[masters_part] = compress_part(masters_part, masters_xml)
+            self.parts[rels_part] = compress_part(rels_part, xml_decl_standalone + masters_rels.to_xml())
+
+        return dict((name, master_ids[name]) for name in names)
+
     def add_connect(self, page_rel_id, shape1, shape2):
-        return self.page_collection.add_shape(page_rel_id, shape1, shape2)
+        return self.page_collection.add_connect(page_rel_id, shape1, shape2)
+
+
+def load_document(data, lazy=False):
+    """Load a diagram from bytes, runs in the executor of the async API
+
+    :param data: The *.vsdx file contents
+    :param lazy: Leave the pages unparsed
+    :return: Instance of :class:`Document`
+    """
+    document = Document.from_bytes(data)
+    if not lazy:
+        for page in document.page_collection.pages:
+            if not page.loaded:
+                page.load()
+    return document
+
+
+def read_thumbnail():
+    """Return the contents of the default thumbnail"""
+    with open(THUMBNAIL, 'rb') as f:
+        return f.read()
+
+
+def static_part(package, part_name, data):
+    """Compress a static part, or return it from :data:`static_parts`
+
+    :param package: Instance of :class:`PackageWriter`
+    :param part_name: Name of the part. e.g. 'docProps/thumbnail.emf'
+    :param data: The part contents as str or bytes
+    :return: Instance of :class:`RawPart`
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    key = (part_name, package.policy.level_for(part_name), hashlib.sha1(data).digest())
+    with static_parts_lock:
+        raw_part = static_parts.get(key)
+        if raw_part is not None:
+            static_parts.move_to_end(key)
+            return raw_part
+
+    raw_part = package.compress(part_name, data)
+    with static_parts_lock:
+        static_parts[key] = raw_part
+        while len(static_parts) > STATIC_PARTS_MAX:
+            static_parts.popitem(last=False)
+    return raw_part
+
+
+def compress_page(page, compresslevel=zlib.Z_DEFAULT_COMPRESSION):
+    """Serialise and compress a single page, runs in a worker process
+
+    :param page: Instance of :class:`Page`
+    :param compresslevel: zlib compression level, or :data:`STORED`
+    :return: Instance of :class:`RawPart`
+    """
+    compressor = PartCompressor('visio/pages/{}'.format(page.filename), compresslevel)
+    page.write_xml(compressor)
+    return compressor.raw_part()
 
 
 def main():
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+"""
+visiopy.xmlutils
+
+This module formats the XML fragments shared by the page serialisers
+
+:copyright: (c) 2016 by Mathijs Mortimer.
+"""
+
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+
+ATTR_ENTITIES = {'"': '&quot;', '\n': '&#10;', '\r': '&#13;', '\t': '&#09;'}
+
+# Prefixes of the namespaces used within page?.xml, visio is the default
+NAMESPACE_PREFIXES = {'http://schemas.microsoft.com/office/visio/2012/main': '',
+                      'http://schemas.openxmlformats.org/officeDocument/2006/relationships': 'r:',
+                      'http://www.w3.org/XML/1998/namespace': 'xml:'}
+
+
+def xml_attrs(attrs):
+    """Format XML attributes
+
+    :param attrs: iterable of (name, value) tuples
+    :return: string of escaped attributes with a leading space
+    """
+    return ''.join(' {}="{}"'.format(name, escape_attr(value))
+                   for name, value in attrs)
+
+
+def xml_cell(name, value, formula=None):
+    """Format a single ShapeSheet Cell element
+
+    :param name: The name of the cell e.g. 'PinX'
+    :param value: The value of the cell
+    :param formula: Optional formula of the cell e.g. 'Width*0.5'
+    :return: XML string
+    """
+    if formula is None:
+        return '<Cell N="{}" V="{}"/>'.format(name, escape_attr(value))
+    return '<Cell N="{}" V="{}" F="{}"/>'.format(name, escape_attr(value),
+                                                escape_attr(formula))
+
+
+def escape_attr(value):
+    """Escape a value for use within a double quoted XML attribute"""
+    return escape(str(value), ATTR_ENTITIES)
+
+
+# The per shape part of a Shape element, the geometry is spliced in
+# pre-serialised from a :class:`GeometryTemplate`
+SHAPE_XML = ('<Shape ID="{}" Type="{}" LineStyle="{}" FillStyle="{}" TextStyle="{}">'
+             '<Cell N="PinX" V="{}"/>'
+             '<Cell N="PinY" V="{}"/>'
+             '<Cell N="Width" V="{}"/>'
+             '<Cell N="Height" V="{}"/>'
+             '<Cell N="LocPinX" V="{}" F="Width*0.5"/>'
+             '<Cell N="LocPinY" V="{}" F="Height*0.5"/>'
+             '<Cell N="Angle" V="{}"/>'
+             '<Cell N="FlipX" V="{}"/>'
+             '<Cell N="FlipY" V="{}"/>'
+             '<Cell N="ResizeMode" V="{}"/>'
+             '{}{}'
+             '</Shape>')
+
+
+def shape_xml(id, type, line_style, fill_style, text_style, pin_x, pin_y,
+              width, height, loc_pin_x, loc_pin_y, angle, flip_x, flip_y,
+              resize_mode, geometry):
+    """Format a single Shape element
+
+    Shared by :class:`Shape` and :class:`ShapeStore` so both write the
+    exact same XML. The cells are written as floats and ResizeMode as int,
+    the types of the store columns, whatever type the values were given
+    in. Only the per shape cells are formatted here.
+
+    :param geometry: Instance of :class:`GeometryTemplate`
+    :return: XML string
+    """
+    return SHAPE_XML.format(escape_attr(id), escape_attr(type),
+                            escape_attr(line_style), escape_attr(fill_style),
+                            escape_attr(text_style), float(pin_x), float(pin_y),
+                            float(width), float(height), float(loc_pin_x),
+                            float(loc_pin_y), float(angle),
+                            '1' if flip_x else '0', '1' if flip_y else '0',
+                            int(resize_mode), geometry.cells, geometry.section)
+
+
+def qualified_name(name):
+    """Turn an ElementTree {namespace}name into a prefixed name
+
+    :return: The prefixed name, or None for namespaces without a prefix
+    """
+    if name[0] != '{':
+        return name
+    namespace, name = name[1:].split('}', 1)
+    prefix = NAMESPACE_PREFIXES.get(namespace)
+    if prefix is None:
+        return None
+    return prefix + name
+
+
+def element_xml(elem):
+    """Serialise a parsed element back into page?.xml markup
+
+    Used to carry elements that are not modelled, such as Text or
+    ForeignData, through a round trip. Tags and attributes are written with
+    the prefixes declared on PageContents, so no namespace declarations are
+    repeated.
+
+    :param elem: An xml.etree.ElementTree element
+    :return: XML string
+    """
+    tag = qualified_name(elem.tag)
+    attrs = [(qualified_name(name), value) for name, value in elem.items()]
+    if tag is None or any(name is None for name, value in attrs):
+        # Unknown namespace, let ElementTree declare it inline
+        tail, elem.tail = elem.tail, None
+        xml = ET.tostring(elem, encoding='unicode')
+        elem.tail = tail
+        return xml
+
+    xml = ['<', tag, xml_attrs(attrs)]
+    if elem.text or len(elem):
+        xml.append('>')
+        xml.append(escape(elem.text or ''))
+        for child in elem:
+            xml.append(element_xml(child))
+            xml.append(escape(child.tail or ''))
+        xml.append('</{}>'.format(tag))
+    else:
+        xml.append('/>')
+    return ''.join(xml)